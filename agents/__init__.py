@@ -1,4 +1,8 @@
-from agents.a_star_agent import AStarAgent
+from agents.a_star_agent import AStarAgent, DistanceFieldAStarAgent, LandmarkAStarAgent
+from agents.batch import plan_many
 from agents.d_star_lite_agent import DStarLiteAgent
-from agents.dijkstra_agent import DijkstraAgent
+from agents.dijkstra_agent import DijkstraAgent, DistanceFieldDijkstraAgent
+from agents.flow_field_agent import FlowFieldAgent
+from agents.hpa_star_agent import HPAStarAgent
+from agents.jps_agent import JPSAgent
 from agents.replay_agent import ReplayAgent
\ No newline at end of file
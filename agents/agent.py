@@ -1,24 +1,26 @@
 import copy
+from collections import deque
+from itertools import islice
 
-import config
 import numpy as np
-import pygame
 import time
 
 from helpers.path_helper import compute_path_length
 
 
 class Agent:
+    lookahead_steps = 5  # steps of the plan checked before each move by _should_replan
+
     def __init__(self, start, goal):
-        self.cell_size = config.CONFIG["map"]["cell_size"]
         # TODO These should be in the state
         self.start = start
         self.goal = goal
         self.position = start
-        self.plan = []  # list of (x, y) steps
+        self.plan = deque()  # (x, y) steps, consumed from the left as the agent moves
         self.explored = set()  # for planning visualization
         self.visited = []  # for movement visualization
         self._planning_times = []
+        self.total_planning_time = 0.0
 
         self.state = {"agent_type": self.type_name, "start_pos": tuple(start), "goal_pos": tuple(goal)}
 
@@ -29,28 +31,39 @@ class Agent:
         """
         raise NotImplementedError()
 
+    def _follow_plan(self):
+        """Move to the next step of the plan, if there is one."""
+        if self.plan:
+            self.position = self.plan.popleft()
+            self.visited.append(self.position)
 
-    def has_reached_goal(self):
-        if self.position == self.goal:
+    def _should_replan(self, game_map) -> bool:
+        """
+        Check if replanning is needed by looking ahead in the current plan.
+
+        Returns:
+            bool: True if replanning is needed, False otherwise
+        """
+        if not self.plan:
             return True
 
+        for pos in islice(self.plan, self.lookahead_steps):
+            if not game_map.is_passable(pos):
+                return True
         return False
 
-    def draw(self, surface):
-        """Visualize explored and visited positions."""
-        for (x, y) in self.explored:
-            rect = pygame.Rect(x * self.cell_size, y * self.cell_size, self.cell_size, self.cell_size)
-            pygame.draw.rect(surface, (173, 216, 230), rect)  # light blue = explored
+    def has_reached_goal(self):
+        if self.position == self.goal:
+            return True
 
-        for (x, y) in self.visited:
-            rect = pygame.Rect(x * self.cell_size, y * self.cell_size, self.cell_size, self.cell_size)
-            pygame.draw.rect(surface, (144, 238, 144), rect)  # light green = visited
+        return False
 
     def plan_path(self, game_map):
         start_time = time.perf_counter()
         self._plan_path(game_map)
         planning_time = time.perf_counter() - start_time
         self._planning_times.append(planning_time)
+        self.total_planning_time += planning_time
 
     def _plan_path(self, game_map):
         raise NotImplementedError()
@@ -0,0 +1,162 @@
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, NamedTuple
+
+from agents.search.a_star import SearchWorkspace, a_star_search
+from agents.search.d_star_lite import DStarLite
+from agents.search.dijkstra import bidirectional_dijkstra
+from agents.search.distance_field import get_distance_field
+from agents.search.hpa import hpa_search
+from agents.search.jps import jump_point_search
+from agents.search.landmarks import get_landmarks
+from agents.search.search_result import SearchResult
+
+
+class BatchEngine(NamedTuple):
+    search: Callable  # (game_map, start, goal, workspace) -> SearchResult
+    drops_start: bool  # False when the agent of the same name steps on its start first (the A* agent does)
+
+
+# engines by agent type, each one plans like the first plan of that agent
+ENGINES = {}
+
+
+def register_engine(name, drops_start=True):
+    def _wrap(search):
+        ENGINES[name] = BatchEngine(search, drops_start)
+        return search
+    return _wrap
+
+
+@register_engine("astar", drops_start=False)
+def _a_star(game_map, start, goal, workspace):
+    return a_star_search(game_map, start, goal, workspace=workspace)
+
+
+@register_engine("astar_field", drops_start=False)
+def _a_star_field(game_map, start, goal, workspace):
+    heuristic = get_distance_field(game_map, goal).cells.__getitem__
+    return a_star_search(game_map, start, goal, heuristic=heuristic, workspace=workspace)
+
+
+@register_engine("astar_alt", drops_start=False)
+def _a_star_alt(game_map, start, goal, workspace):
+    heuristic = get_landmarks(game_map).heuristic(game_map, goal)
+    return a_star_search(game_map, start, goal, heuristic=heuristic, workspace=workspace)
+
+
+@register_engine("jps")
+def _jump_point_search(game_map, start, goal, workspace):
+    return jump_point_search(game_map, start, goal)
+
+
+@register_engine("hpa")
+def _hpa(game_map, start, goal, workspace):
+    return hpa_search(game_map, start, goal)
+
+
+@register_engine("dijkstra")
+def _dijkstra(game_map, start, goal, workspace):
+    return bidirectional_dijkstra(game_map, start, goal)
+
+
+@register_engine("dijkstra_field")
+def _dijkstra_field(game_map, start, goal, workspace):
+    if game_map.dynamic_areas:
+        return bidirectional_dijkstra(game_map, start, goal)
+    return get_distance_field(game_map, goal).search(game_map, start)
+
+
+@register_engine("flowfield")
+def _flow_field(game_map, start, goal, workspace):
+    return get_distance_field(game_map, goal).search(game_map, start)
+
+
+@register_engine("dstar")
+def _d_star_lite(game_map, start, goal, workspace):
+    if not game_map.is_reachable(start, goal):
+        return SearchResult([], [])
+    search = DStarLite(game_map, start, goal)
+    search.compute_shortest_path(game_map)
+    explored = [game_map.cell_position(cell) for cell in search.expanded]
+    if tuple(start) == tuple(goal):
+        return SearchResult([tuple(start)], explored)
+    path = search.extract_path(game_map)
+    return SearchResult([tuple(start)] + path if path else [], explored)
+
+
+def _plan_chunk(game_map, pairs, engine, keep_explored):
+    search = ENGINES[engine].search
+    workspace = SearchWorkspace(len(game_map.passable_cells))
+    paths, planning_times, nodes_expanded, explored = [], [], [], []
+    for start, goal in pairs:
+        start_time = time.perf_counter()
+        result = search(game_map, start, goal, workspace)
+        planning_times.append(time.perf_counter() - start_time)
+        paths.append(result.path)
+        nodes_expanded.append(len(result.explored))
+        if keep_explored:
+            explored.append(result.explored)
+    return paths, planning_times, nodes_expanded, explored
+
+
+# map of the batch being planned, installed once per worker process
+_worker_map = None
+
+
+def _init_worker(game_map):
+    global _worker_map
+    _worker_map = game_map
+
+
+def _plan_worker_chunk(pairs, engine, keep_explored):
+    return _plan_chunk(_worker_map, pairs, engine, keep_explored)
+
+
+def plan_many(game_map, pairs, engine="astar", max_workers=None, chunk_size=None, keep_explored=False):
+    """
+    Plan every (start, goal) pair on one map. The map preprocessing (component labels, HPA* abstraction, distance
+    fields) and the search arrays are shared by all the queries instead of being redone for each agent.
+
+    Args:
+        game_map: Map to plan on, it is not updated.
+        pairs: (start, goal) pairs, or the dict of create_positions.
+        engine: Name of the engine in ENGINES, the agent types that plan once and then follow their plan.
+        max_workers: Plan in that many processes, the map is sent once to each of them. In this process when None.
+        chunk_size: Number of pairs sent to a worker at once.
+        keep_explored: Also return the explored cells of every query, they can be large.
+
+    Returns:
+        (paths, stats) where paths[i] is the path of pairs[i], start and goal included, empty when the goal can't be
+        reached. stats holds the planning_times and nodes_expanded lists of the queries, the number of solved
+        queries and the total_time, plus the explored list when keep_explored is True.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'. Known: {sorted(ENGINES)}")
+    if isinstance(pairs, dict):
+        pairs = [(positions["start"], positions["goal"]) for positions in pairs.values()]
+    pairs = [(tuple(start), tuple(goal)) for start, goal in pairs]
+
+    start_time = time.perf_counter()
+    if max_workers is None or max_workers <= 1 or len(pairs) <= 1:
+        chunks = [_plan_chunk(game_map, pairs, engine, keep_explored)]
+    else:
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(len(pairs) / (max_workers * 4)))
+        chunked_pairs = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(game_map,)) as executor:
+            chunks = list(executor.map(partial(_plan_worker_chunk, engine=engine, keep_explored=keep_explored),
+                                       chunked_pairs))
+
+    paths = [path for chunk in chunks for path in chunk[0]]
+    stats = {
+        "planning_times": [t for chunk in chunks for t in chunk[1]],
+        "nodes_expanded": [n for chunk in chunks for n in chunk[2]],
+        "solved": sum(1 for path in paths if path),
+        "total_time": time.perf_counter() - start_time,
+    }
+    if keep_explored:
+        stats["explored"] = [e for chunk in chunks for e in chunk[3]]
+    return paths, stats
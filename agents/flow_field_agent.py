@@ -0,0 +1,53 @@
+from agents.agent import Agent
+from agents.agent_factory import factory
+from agents.search.distance_field import get_distance_field
+
+
+@factory.register_decorator("flowfield")
+class FlowFieldAgent(Agent):
+    """
+    Follows the distance field of its goal, every step goes to the neighbour closest to the goal. There is no plan,
+    the field is fetched again whenever the map changed since it was built.
+    """
+
+    @property
+    def display_name(self):
+        return "flow field"
+
+    @property
+    def type_name(self):
+        return "flowfield"
+
+    def __init__(self, start, goal):
+        super().__init__(start, goal)
+        self.field = None
+
+    def update(self, game_map):
+        if self.has_reached_goal():
+            return
+
+        if self.field is None or self.field.revision is not game_map.revision:
+            self.plan_path(game_map)
+
+        next_position = self._next_position(game_map)
+        if next_position is not None:
+            self.position = next_position
+            self.visited.append(self.position)
+
+    def _next_position(self, game_map):
+        if self.field is None:
+            return None
+
+        next_cell = self.field.next_cell(game_map, game_map.cell_index(self.position))
+        if next_cell is None:
+            return None
+        return game_map.cell_position(next_cell)
+
+    def _plan_path(self, game_map):
+        if not game_map.is_reachable(self.position, self.goal):
+            self.field = None
+            return
+
+        self.field = get_distance_field(game_map, self.goal)
+        self.explored.clear()
+        self.explored.update(self.field.explored())
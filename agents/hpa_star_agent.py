@@ -0,0 +1,81 @@
+from collections import deque
+
+from agents.agent import Agent
+from agents.agent_factory import factory
+from agents.search.a_star import a_star_search
+from agents.search.hpa import find_abstract_path, get_cluster_abstraction, is_short_query, refine_segment
+
+
+@factory.register_decorator("hpa")
+class HPAStarAgent(Agent):
+    """
+    Hierarchical A*: plans on the cluster abstraction of the map and only refines the next segments of the abstract
+    path into cells, enough to cover the lookahead.
+    """
+
+    @property
+    def display_name(self):
+        return "HPA*"
+
+    @property
+    def type_name(self):
+        return "hpa"
+
+    def __init__(self, start, goal, lookahead_steps=5, cluster_size=10):
+        super().__init__(start, goal)
+        self.planned = False
+        self.lookahead_steps = lookahead_steps
+        self.cluster_size = cluster_size
+        self.abstraction = None
+        self._abstract_path = deque()  # abstract nodes (cell ids) not refined yet
+
+    def update(self, game_map):
+        if game_map.last_delta:
+            self._get_abstraction(game_map).invalidate(game_map.last_delta.changed_positions())
+
+        self._refine(game_map)
+        if not self.planned or self._should_replan(game_map):
+            self.plan_path(game_map)
+            self.planned = True
+
+        self._follow_plan()
+
+    def _get_abstraction(self, game_map):
+        if self.abstraction is None:
+            shared = get_cluster_abstraction(game_map, self.cluster_size)
+            # the shared abstraction is the map as generated, a dynamic map gets its own copy to keep up to date
+            self.abstraction = shared.copy() if game_map.dynamic_areas else shared
+        return self.abstraction
+
+    def _plan_path(self, game_map):
+        self.plan = deque()
+        self._abstract_path = deque()
+        self.explored.clear()
+        if not game_map.is_reachable(self.position, self.goal):
+            return
+
+        abstraction = self._get_abstraction(game_map)
+        if not is_short_query(self.position, self.goal, self.cluster_size):
+            result = find_abstract_path(game_map, abstraction, self.position, self.goal)
+            self.explored.update(game_map.cell_position(cell) for cell in result.explored)
+            if result.path:
+                self._abstract_path = deque(result.path[1:])
+                self._refine(game_map)
+                return
+
+        # short queries, or the abstraction has no path left on a dynamic map
+        result = a_star_search(game_map, self.position, self.goal)
+        self.explored.update(result.explored)
+        self.plan = deque(result.path[1:])
+
+    def _refine(self, game_map):
+        """Refine abstract segments until the plan covers the lookahead, a blocked segment forces a replan."""
+        while self._abstract_path and len(self.plan) <= self.lookahead_steps:
+            from_cell = game_map.cell_index(self.plan[-1] if self.plan else self.position)
+            cells = refine_segment(game_map, self.abstraction, from_cell, self._abstract_path[0])
+            if cells is None:
+                self._abstract_path.clear()
+                self.planned = False
+                return
+            self._abstract_path.popleft()
+            self.plan.extend(game_map.cell_position(cell) for cell in cells)
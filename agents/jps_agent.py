@@ -0,0 +1,34 @@
+from collections import deque
+
+from agents.agent import Agent
+from agents.agent_factory import factory
+from agents.search.jps import jump_point_search
+
+
+@factory.register_decorator("jps")
+class JPSAgent(Agent):
+    @property
+    def display_name(self):
+        return "jump point search"
+
+    @property
+    def type_name(self):
+        return "jps"
+
+    def __init__(self, start, goal, lookahead_steps=5):
+        super().__init__(start, goal)
+        self.planned = False
+        self.lookahead_steps = lookahead_steps
+
+    def update(self, game_map):
+        if not self.planned or self._should_replan(game_map):
+            self.plan_path(game_map)
+            self.planned = True
+
+        self._follow_plan()
+
+    def _plan_path(self, game_map):
+        result = jump_point_search(game_map, self.position, self.goal)
+        self.explored.clear()
+        self.explored.update(result.explored)
+        self.plan = deque(result.path[1:])  # the search starts from the current position
@@ -1,3 +1,6 @@
+from collections import deque
+
+import numpy as np
 from agents.agent import Agent
 from agents.agent_factory import factory
 
@@ -12,25 +15,24 @@ class ReplayAgent(Agent):
     def type_name(self):
         return "replay"
 
-    def __init__(self, trace):
+    def __init__(self, trace, verbose=False):
         super().__init__(trace["start_pos"], trace["goal_pos"])
+        self.verbose = verbose
 
         self.planned = True
-        self.plan = trace["agent_visited"]
+        # the trace is shared with the task, copy what gets consumed while replaying.
+        # Binary traces hold an int32 array, positions are turned back into plain lists like json ones.
+        self.plan = deque(np.asarray(trace["agent_visited"]).tolist())
         self.explored = set([tuple(pos) for pos in self.plan])
-        self.analysis = trace["analysis"]
+        self.analysis = deque(trace.get("analysis", []))
         self.current_step_analysis = None
-        print("XXXXXXXXXXXXXXX")
-        for i, step in enumerate(trace["analysis"]):
-            print(f"Step: {i}")
-            for k,v in step.items():
-                print(f"\t{k} : {v}")
+        self._debug_analysis()
 
     def update(self, game_map):
         if self.plan:
-            self.position = self.plan.pop(0)
+            self.position = self.plan.popleft()
             if len(self.analysis) > 0:
-                self.current_step_analysis = self.analysis.pop(0)
+                self.current_step_analysis = self.analysis.popleft()
             self.visited.append(self.position)
 
     def has_reached_goal(self):
@@ -47,3 +49,11 @@ class ReplayAgent(Agent):
                 self.state[k] = v
 
         return self.state
+
+    def _debug_analysis(self):
+        if not self.verbose:
+            return
+        for i, step in enumerate(self.analysis):
+            print(f"Step: {i}")
+            for k, v in step.items():
+                print(f"\t{k} : {v}")
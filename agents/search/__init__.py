@@ -0,0 +1,8 @@
+from agents.search.a_star import SearchWorkspace, a_star_search
+from agents.search.d_star_lite import DStarLite
+from agents.search.dijkstra import bidirectional_dijkstra
+from agents.search.distance_field import DistanceField, DistanceFieldCache, get_distance_field
+from agents.search.hpa import ClusterAbstraction, hpa_search
+from agents.search.jps import jump_point_search
+from agents.search.landmarks import Landmarks, get_landmarks
+from agents.search.search_result import SearchResult
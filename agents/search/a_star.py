@@ -0,0 +1,156 @@
+import heapq
+import math
+
+from agents.search.search_result import SearchResult
+
+SQRT_2 = math.sqrt(2)
+
+
+def octile_distance(a, b):
+    # here we use Octile distance because it is closer to our movement scheme.
+    dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+    return max(dx, dy) + (SQRT_2 - 1) * min(dx, dy)
+
+
+def cell_octile_distance(a, b, stride):
+    """octile_distance between two cell ids of a map with this stride, see Map.cell_index."""
+    dx, dy = abs(a // stride - b // stride), abs(a % stride - b % stride)
+    return max(dx, dy) + (SQRT_2 - 1) * min(dx, dy)
+
+
+def _path_precedes(a, b, parent, depth):
+    """
+    True if the path from the start to a sorts before the path from the start to b, comparing the lists of cells
+    lexicographically. This is the order the heap used when it stored whole paths in its entries.
+    """
+    a_up, b_up = a, b
+    while depth[a_up] > depth[b_up]:
+        a_up = parent[a_up]
+    while depth[b_up] > depth[a_up]:
+        b_up = parent[b_up]
+    if a_up == b_up:
+        # one path is a prefix of the other, the shorter one comes first
+        return depth[a] < depth[b]
+
+    while parent[a_up] != parent[b_up]:
+        a_up = parent[a_up]
+        b_up = parent[b_up]
+    return a_up < b_up
+
+
+class SearchWorkspace:
+    """
+    Per cell arrays of a search, allocated once for a map size and reused by the following searches. Only the cells
+    a search touched are reset before the next one, so many queries on a map don't pay for the whole grid each time.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.g_score = [math.inf] * size
+        self.parent = [-1] * size
+        self.depth = [0] * size
+        self.closed = bytearray(size)
+        self.touched = []
+
+    def reset(self):
+        g_score, parent, depth, closed = self.g_score, self.parent, self.depth, self.closed
+        for cell in self.touched:
+            g_score[cell] = math.inf
+            parent[cell] = -1
+            depth[cell] = 0
+            closed[cell] = 0
+        self.touched.clear()
+
+
+def a_star_search(game_map, start, goal, heuristic_weight=1 + 1e-4, heuristic=None, workspace=None):
+    """
+    A* over the 8-connected grid, keeping g-scores and parent pointers in flat arrays indexed by cell id.
+    Cell ids sort like (x, y) tuples (see Map.cell_index), so heap tie-breaking is the same as on positions.
+
+    Args:
+        game_map: Map to search, cells are traversable when they are neither obstacles nor eroded.
+        start: (x, y) start cell.
+        goal: (x, y) goal cell.
+        heuristic_weight: Small inflation of the heuristic to break ties and favor depth over width.
+        heuristic: Function of a cell id estimating its cost to the goal without overestimating it, like the
+            distance of a DistanceField. Octile distance when None.
+        workspace: SearchWorkspace of the map size to reuse, a new one is allocated when None.
+
+    Returns:
+        SearchResult with the path from start to goal and the expanded cells.
+    """
+    if not game_map.is_reachable(start, goal):
+        # no need to exhaust the component of the start to find out
+        return SearchResult([], [])
+
+    passable = game_map.passable_cells
+    stride = game_map.stride
+    size = len(passable)
+    neighbor_table = game_map.neighbor_table
+
+    start_cell = game_map.cell_index(start)
+    goal_cell = game_map.cell_index(goal)
+    goal_x, goal_y = goal
+    diagonal_bonus = SQRT_2 - 1
+
+    if workspace is None or workspace.size != size:
+        workspace = SearchWorkspace(size)
+    else:
+        workspace.reset()
+    g_score, parent, depth, closed = workspace.g_score, workspace.parent, workspace.depth, workspace.closed
+    touched = workspace.touched
+    inf = math.inf
+    explored = []
+
+    g_score[start_cell] = 0.0
+    touched.append(start_cell)
+    nodes_to_explore = [(octile_distance(start, goal), 0.0, start_cell)]
+
+    while nodes_to_explore:
+        _, path_cost, current = heapq.heappop(nodes_to_explore)
+        if closed[current]:
+            continue
+        closed[current] = 1
+        explored.append(current)
+
+        if current == goal_cell:
+            break
+
+        current_depth = depth[current] + 1
+        for offset, move_cost in neighbor_table:
+            neighbor = current + offset
+            if not passable[neighbor] or closed[neighbor]:
+                continue
+
+            new_path_cost = path_cost + move_cost
+            previous_cost = g_score[neighbor]
+            if new_path_cost < previous_cost:
+                if previous_cost == inf:
+                    touched.append(neighbor)
+                g_score[neighbor] = new_path_cost
+                parent[neighbor] = current
+                depth[neighbor] = current_depth
+
+                if heuristic is None:
+                    # cell_octile_distance, inlined since this is the hottest loop of the planner
+                    dx, dy = abs(neighbor // stride - 1 - goal_x), abs(neighbor % stride - 1 - goal_y)
+                    estimate = max(dx, dy) + diagonal_bonus * min(dx, dy)
+                else:
+                    estimate = heuristic(neighbor)
+                heapq.heappush(nodes_to_explore, (new_path_cost + heuristic_weight * estimate, new_path_cost, neighbor))
+            elif new_path_cost == previous_cost and _path_precedes(current, parent[neighbor], parent, depth):
+                # same cost, keep the parent the heap would have popped first when it compared full paths
+                parent[neighbor] = current
+                depth[neighbor] = current_depth
+
+    explored = [(cell // stride - 1, cell % stride - 1) for cell in explored]
+    if not closed[goal_cell]:
+        return SearchResult([], explored)
+
+    path = []
+    cell = goal_cell
+    while cell != -1:
+        path.append((cell // stride - 1, cell % stride - 1))
+        cell = parent[cell]
+    path.reverse()
+    return SearchResult(path, explored)
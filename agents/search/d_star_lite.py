@@ -0,0 +1,142 @@
+import math
+
+from agents.search.a_star import cell_octile_distance
+from helpers.priority_queue import IndexedPriorityQueue
+
+# Keys summing costs and heuristics in another order can differ in their last bits. Cells whose first key ties with
+# the start's may sort after it in the queue, so the search goes on while the first key is within this tolerance.
+KEY_TOLERANCE = 1e-9
+
+
+class DStarLite:
+    """
+    Optimized D* Lite (Koenig and Likhachev, 2002) over the 8-connected grid of a map, searching from the goal back
+    to the agent. Moves cost 1 or sqrt(2) like in A* and entering a cell is only possible when it is traversable.
+
+    g and rhs are flat lists indexed by cell id (see Map.cell_index). After the first search, only the cells around
+    the ones whose traversability changed are updated (update_cells), and the next search repairs the previous one.
+    """
+
+    def __init__(self, game_map, start, goal):
+        size = len(game_map.passable_cells)
+        self.stride = game_map.stride
+        self.neighbor_table = game_map.neighbor_table
+        self.g = [math.inf] * size
+        self.rhs = [math.inf] * size
+        self.queue = IndexedPriorityQueue()
+        self.km = 0.0
+        self.goal_cell = game_map.cell_index(goal)
+        self.start_cell = game_map.cell_index(start)
+        self.expanded = []  # cells expanded by the last search
+
+        self.rhs[self.goal_cell] = 0.0
+        self.queue.push(self.goal_cell, self._calculate_key(self.goal_cell))
+
+    def _heuristic(self, cell):
+        # octile distance from the start, consistent with the move costs
+        return cell_octile_distance(cell, self.start_cell, self.stride)
+
+    def _calculate_key(self, cell):
+        g_rhs = min(self.g[cell], self.rhs[cell])
+        return g_rhs + self._heuristic(cell) + self.km, g_rhs
+
+    def _best_successor_cost(self, cell, passable):
+        best = math.inf
+        for offset, move_cost in self.neighbor_table:
+            successor = cell + offset
+            if passable[successor]:
+                cost = move_cost + self.g[successor]
+                if cost < best:
+                    best = cost
+        return best
+
+    def _update_vertex(self, cell):
+        if self.g[cell] != self.rhs[cell]:
+            self.queue.push(cell, self._calculate_key(cell))
+        else:
+            self.queue.remove(cell)
+
+    def _is_predecessor(self, cell, passable):
+        # blocked cells can't be entered, only the agent can stand on one when an area moved next to it
+        return cell != self.goal_cell and (passable[cell] or cell == self.start_cell)
+
+    def move_start(self, start):
+        """Move the start to the agent position, the keys already queued stay valid thanks to km."""
+        start_cell = self.start_cell
+        self.start_cell = self.stride * (start[0] + 1) + start[1] + 1
+        self.km += self._heuristic(start_cell)
+
+    def update_cells(self, game_map, positions):
+        """
+        Account for cells whose traversability changed: the cost of every move into them changed. The cells
+        themselves are updated too, nothing kept their rhs up to date while they were blocked.
+        """
+        passable = game_map.passable_cells
+        for x, y in positions:
+            cell = (x + 1) * self.stride + y + 1
+            for offset, _ in [(0, 0)] + self.neighbor_table:
+                predecessor = cell - offset
+                if self._is_predecessor(predecessor, passable):
+                    self.rhs[predecessor] = self._best_successor_cost(predecessor, passable)
+                    self._update_vertex(predecessor)
+
+    def compute_shortest_path(self, game_map):
+        passable = game_map.passable_cells
+        g, rhs, queue = self.g, self.rhs, self.queue
+        start = self.start_cell
+        self.expanded = []
+
+        while queue:
+            k_old, cell = queue.peek()
+            if not (k_old[0] <= self._calculate_key(start)[0] + KEY_TOLERANCE or rhs[start] > g[start]):
+                break
+
+            k_new = self._calculate_key(cell)
+            if k_old < k_new:
+                queue.push(cell, k_new)
+                continue
+
+            self.expanded.append(cell)
+            if g[cell] > rhs[cell]:
+                g[cell] = rhs[cell]
+                queue.remove(cell)
+                if not passable[cell]:
+                    continue
+                for offset, move_cost in self.neighbor_table:
+                    predecessor = cell - offset
+                    if self._is_predecessor(predecessor, passable) and move_cost + g[cell] < rhs[predecessor]:
+                        rhs[predecessor] = move_cost + g[cell]
+                        self._update_vertex(predecessor)
+            else:
+                g_old = g[cell]
+                g[cell] = math.inf
+                if cell != self.goal_cell:
+                    rhs[cell] = self._best_successor_cost(cell, passable)
+                self._update_vertex(cell)
+                if not passable[cell]:
+                    continue
+                for offset, move_cost in self.neighbor_table:
+                    predecessor = cell - offset
+                    if self._is_predecessor(predecessor, passable) and rhs[predecessor] == move_cost + g_old:
+                        rhs[predecessor] = self._best_successor_cost(predecessor, passable)
+                        self._update_vertex(predecessor)
+
+    def extract_path(self, game_map):
+        """Follow the cheapest successors from the start. Returns the (x, y) cells up to the goal, start excluded."""
+        passable = game_map.passable_cells
+        path = []
+        cell = self.start_cell
+        seen = {cell}
+        while cell != self.goal_cell:
+            best_cell, best_cost = None, math.inf
+            for offset, move_cost in self.neighbor_table:
+                successor = cell + offset
+                if passable[successor] and move_cost + self.g[successor] < best_cost:
+                    best_cell, best_cost = successor, move_cost + self.g[successor]
+
+            if best_cell is None or best_cell in seen:
+                return []
+            seen.add(best_cell)
+            path.append(game_map.cell_position(best_cell))
+            cell = best_cell
+        return path
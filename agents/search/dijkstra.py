@@ -0,0 +1,98 @@
+import heapq
+import math
+
+from agents.search.search_result import SearchResult
+
+
+def bidirectional_dijkstra(game_map, start, goal):
+    """
+    Dijkstra from both ends at once over the 8-connected grid, the side with the smallest frontier cost expands next.
+    Heap entries made stale by a cheaper one are skipped. The best path through an edge joining the two searches is
+    kept, and the search stops once the two frontier costs add up to at least its cost: nothing left can beat it.
+
+    Args:
+        game_map: Map to search, cells are traversable when they are neither obstacles nor eroded.
+        start: (x, y) start cell.
+        goal: (x, y) goal cell.
+
+    Returns:
+        SearchResult with the path from start to goal and the cells expanded by both sides.
+    """
+    if not game_map.is_reachable(start, goal):
+        return SearchResult([], [])
+
+    passable = game_map.passable_cells
+    size = len(passable)
+    neighbor_table = game_map.neighbor_table
+    start_cell = game_map.cell_index(start)
+    goal_cell = game_map.cell_index(goal)
+    if start_cell == goal_cell:
+        return SearchResult([tuple(start)], [tuple(start)])
+
+    inf = math.inf
+    forward_cost, backward_cost = [inf] * size, [inf] * size
+    forward_parent, backward_parent = [-1] * size, [-1] * size
+    forward_cost[start_cell] = 0.0
+    backward_cost[goal_cell] = 0.0
+    forward_heap, backward_heap = [(0.0, start_cell)], [(0.0, goal_cell)]
+    explored = []
+
+    best_cost = inf
+    meeting = None  # (forward cell, backward cell) of the edge joining the best path
+    while forward_heap and backward_heap:
+        if forward_heap[0][0] + backward_heap[0][0] >= best_cost:
+            break
+
+        if forward_heap[0][0] <= backward_heap[0][0]:
+            cost, cell = heapq.heappop(forward_heap)
+            if cost > forward_cost[cell]:
+                continue
+            explored.append(cell)
+            for offset, move_cost in neighbor_table:
+                neighbor = cell + offset
+                if not passable[neighbor]:
+                    continue
+                new_cost = cost + move_cost
+                if new_cost < forward_cost[neighbor]:
+                    forward_cost[neighbor] = new_cost
+                    forward_parent[neighbor] = cell
+                    heapq.heappush(forward_heap, (new_cost, neighbor))
+                if new_cost + backward_cost[neighbor] < best_cost:
+                    best_cost = new_cost + backward_cost[neighbor]
+                    meeting = cell, neighbor
+        else:
+            cost, cell = heapq.heappop(backward_heap)
+            if cost > backward_cost[cell]:
+                continue
+            explored.append(cell)
+            if not passable[cell]:
+                continue  # the start, nothing moves into it
+            for offset, move_cost in neighbor_table:
+                neighbor = cell - offset
+                if not passable[neighbor] and neighbor != start_cell:
+                    continue
+                new_cost = cost + move_cost
+                if new_cost < backward_cost[neighbor]:
+                    backward_cost[neighbor] = new_cost
+                    backward_parent[neighbor] = cell
+                    heapq.heappush(backward_heap, (new_cost, neighbor))
+                if forward_cost[neighbor] + new_cost < best_cost:
+                    best_cost = forward_cost[neighbor] + new_cost
+                    meeting = neighbor, cell
+
+    explored = [game_map.cell_position(cell) for cell in explored]
+    if meeting is None:
+        return SearchResult([], explored)
+
+    cells = []
+    cell = meeting[0]
+    while cell != -1:
+        cells.append(cell)
+        cell = forward_parent[cell]
+    cells.reverse()
+    cell = meeting[1]
+    while cell != -1:
+        cells.append(cell)
+        cell = backward_parent[cell]
+    return SearchResult([game_map.cell_position(cell) for cell in cells], explored)
+
@@ -0,0 +1,131 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from agents.search.search_result import SearchResult
+
+
+def build_grid_graph(game_map, passable=None):
+    """
+    Sparse graph of the moves between traversable cells, nodes are cell ids (see Map.cell_index). The cells of the
+    map are used unless another passable array of the same layout is given.
+    The cost of a move only depends on its direction, so the graph is its own reverse.
+    """
+    passable = (game_map.passable if passable is None else passable).reshape(-1).astype(bool)
+    cells = np.flatnonzero(passable)
+    rows, cols, costs = [], [], []
+    for offset, move_cost in game_map.neighbor_table:
+        neighbors = cells + offset
+        valid = passable[neighbors]
+        rows.append(cells[valid])
+        cols.append(neighbors[valid])
+        costs.append(np.full(np.count_nonzero(valid), move_cost))
+
+    size = passable.size
+    return csr_matrix((np.concatenate(costs), (np.concatenate(rows), np.concatenate(cols))), shape=(size, size))
+
+
+class DistanceField:
+    """
+    Cost of the shortest path from every cell to a goal, computed once with a Dijkstra from the goal. Any start then
+    gets its path by walking down the field, one neighbour lookup per step, without searching again.
+    The field is only valid for the revision of the map it was built on.
+    """
+
+    def __init__(self, game_map, goal, graph=None):
+        self.goal = tuple(goal)
+        self.revision = game_map.revision
+        self.stride = game_map.stride
+        if graph is None:
+            graph = build_grid_graph(game_map)
+        self.distances = dijkstra(graph, indices=game_map.cell_index(goal))
+        self.cells = self.distances.data  # fast item access from python loops, like Map.passable_cells
+
+    @property
+    def nbytes(self):
+        return self.distances.nbytes
+
+    def distance(self, game_map, pos):
+        return self.cells[game_map.cell_index(pos)]
+
+    def explored(self):
+        """(x, y) of every cell settled while building the field, the component of the goal."""
+        cells = np.flatnonzero(np.isfinite(self.distances))
+        return list(zip((cells // self.stride - 1).tolist(), (cells % self.stride - 1).tolist()))
+
+    def next_cell(self, game_map, cell):
+        """Neighbour of cell closest to the goal, or None when the goal can't be reached from it."""
+        best_cell, best_cost = None, math.inf
+        distances = self.cells
+        for offset, move_cost in game_map.neighbor_table:
+            neighbor = cell + offset
+            if move_cost + distances[neighbor] < best_cost:
+                best_cell, best_cost = neighbor, move_cost + distances[neighbor]
+        return best_cell
+
+    def search(self, game_map, start):
+        """Path from start down the field, with the same result layout as the searches."""
+        if not game_map.is_reachable(start, self.goal):
+            return SearchResult([], [])
+
+        cell = game_map.cell_index(start)
+        path = [game_map.cell_position(cell)]
+        # the goal is the only cell at 0, every step strictly decreases the distance
+        while self.cells[cell] != 0.0:
+            cell = self.next_cell(game_map, cell)
+            if cell is None:
+                return SearchResult([], self.explored())
+            path.append(game_map.cell_position(cell))
+        return SearchResult(path, self.explored())
+
+
+class DistanceFieldCache:
+    """
+    Distance fields by map revision and goal, the least recently used ones are dropped once the fields take more
+    than max_bytes. Fields of maps with dynamic areas are not kept: every change gets a new revision, so they would
+    never be hit again.
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._fields = OrderedDict()
+        self._graph = None  # (revision, graph) of the last field built, tasks on a map usually come together
+
+    def get(self, game_map, goal):
+        key = (game_map.revision, tuple(goal))
+        if key in self._fields:
+            self._fields.move_to_end(key)
+            return self._fields[key]
+
+        if self._graph is None or self._graph[0] is not game_map.revision:
+            self._graph = game_map.revision, build_grid_graph(game_map)
+        field = DistanceField(game_map, goal, self._graph[1])
+        if game_map.dynamic_areas:
+            return field
+
+        self._fields[key] = field
+        self.nbytes += field.nbytes
+        while self.nbytes > self.max_bytes and len(self._fields) > 1:
+            _, evicted = self._fields.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return field
+
+    def clear(self):
+        self._fields.clear()
+        self.nbytes = 0
+        self._graph = None
+
+
+distance_fields = DistanceFieldCache()
+
+
+def get_distance_field(game_map, goal):
+    """
+    Distance field to goal on the map as it is now. Maps without dynamic areas keep their revision, so every task
+    going to the same goal on them shares one field. On the other maps, a new field is built on each call.
+    """
+    return distance_fields.get(game_map, goal)
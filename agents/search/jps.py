@@ -0,0 +1,149 @@
+import heapq
+
+from agents.search.a_star import cell_octile_distance, octile_distance
+from agents.search.search_result import SearchResult
+from environment.map import NEIGHBOR_DIRECTIONS
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+def _jump_straight(cell, forward, side, passable, goal_cell):
+    """
+    Walk from cell along a cardinal direction (forward cell offset) until the goal, a wall or a cell with a forced
+    neighbour: a blocked side cell whose next cell along the walk is free.
+    """
+    while True:
+        cell += forward
+        if not passable[cell]:
+            return None
+        if cell == goal_cell:
+            return cell
+        if (not passable[cell + side] and passable[cell + side + forward]) or \
+                (not passable[cell - side] and passable[cell - side + forward]):
+            return cell
+
+
+def _jump(cell, dx, dy, passable, stride, goal_cell):
+    """Return the next jump point from cell in direction (dx, dy), or None when the walk hits a wall."""
+    if not dx:
+        return _jump_straight(cell, dy, stride, passable, goal_cell)
+    if not dy:
+        return _jump_straight(cell, dx * stride, 1, passable, goal_cell)
+
+    horizontal, vertical = dx * stride, dy
+    while True:
+        cell += horizontal + vertical
+        if not passable[cell]:
+            return None
+        if cell == goal_cell:
+            return cell
+        if (not passable[cell - horizontal] and passable[cell - horizontal + vertical]) or \
+                (not passable[cell - vertical] and passable[cell + horizontal - vertical]):
+            return cell
+        # a diagonal step is a jump point when one of its straight walks finds one
+        if _jump_straight(cell, horizontal, 1, passable, goal_cell) is not None or \
+                _jump_straight(cell, vertical, stride, passable, goal_cell) is not None:
+            return cell
+
+
+def _successor_directions(cell, parent_cell, passable, stride):
+    """Directions left after pruning: the natural neighbours of the move into cell plus its forced neighbours."""
+    if parent_cell == -1:
+        return NEIGHBOR_DIRECTIONS
+
+    dx = _sign(cell // stride - parent_cell // stride)
+    dy = _sign(cell % stride - parent_cell % stride)
+    if dx and dy:
+        directions = [(0, dy), (dx, 0), (dx, dy)]
+        if not passable[cell - dx * stride]:
+            directions.append((-dx, dy))
+        if not passable[cell - dy]:
+            directions.append((dx, -dy))
+    elif dx:
+        directions = [(dx, 0)]
+        if not passable[cell + 1]:
+            directions.append((dx, 1))
+        if not passable[cell - 1]:
+            directions.append((dx, -1))
+    else:
+        directions = [(0, dy)]
+        if not passable[cell + stride]:
+            directions.append((1, dy))
+        if not passable[cell - stride]:
+            directions.append((-1, dy))
+    return directions
+
+
+def jump_point_search(game_map, start, goal):
+    """
+    Jump Point Search over the 8-connected grid, where diagonal moves may cut corners like in the other planners.
+    Straight and diagonal runs without any decision to make are skipped, only the jump points at their ends are
+    pushed on the heap, so paths have the same octile length as A* with far fewer expansions.
+
+    Args:
+        game_map: Map to search, cells are traversable when they are neither obstacles nor eroded.
+        start: (x, y) start cell.
+        goal: (x, y) goal cell.
+
+    Returns:
+        SearchResult with every cell from start to goal and the expanded jump points.
+    """
+    if not game_map.is_reachable(start, goal):
+        return SearchResult([], [])
+
+    passable = game_map.passable_cells
+    stride = game_map.stride
+    start_cell = game_map.cell_index(start)
+    goal_cell = game_map.cell_index(goal)
+
+    g_score = {start_cell: 0.0}
+    parent = {start_cell: -1}
+    closed = set()
+    explored = []
+    nodes_to_explore = [(octile_distance(start, goal), 0.0, start_cell)]
+
+    while nodes_to_explore:
+        _, path_cost, current = heapq.heappop(nodes_to_explore)
+        if current in closed:
+            continue
+        closed.add(current)
+        explored.append(current)
+
+        if current == goal_cell:
+            break
+
+        for dx, dy in _successor_directions(current, parent[current], passable, stride):
+            jump_point = _jump(current, dx, dy, passable, stride, goal_cell)
+            if jump_point is None or jump_point in closed:
+                continue
+
+            # jump points are reached in a straight or diagonal line, so the octile distance is the cost of the walk
+            new_path_cost = path_cost + cell_octile_distance(jump_point, current, stride)
+            if new_path_cost < g_score.get(jump_point, float("inf")):
+                g_score[jump_point] = new_path_cost
+                parent[jump_point] = current
+                heuristic = cell_octile_distance(jump_point, goal_cell, stride)
+                heapq.heappush(nodes_to_explore, (new_path_cost + heuristic, new_path_cost, jump_point))
+
+    explored = [game_map.cell_position(cell) for cell in explored]
+    if goal_cell not in closed:
+        return SearchResult([], explored)
+
+    jump_points = []
+    cell = goal_cell
+    while cell != -1:
+        jump_points.append(cell)
+        cell = parent[cell]
+    jump_points.reverse()
+
+    # consecutive jump points are always on a straight or diagonal line
+    path = [game_map.cell_position(start_cell)]
+    for from_cell, to_cell in zip(jump_points, jump_points[1:]):
+        delta_x = to_cell // stride - from_cell // stride
+        delta_y = to_cell % stride - from_cell % stride
+        step = _sign(delta_x) * stride + _sign(delta_y)
+        for i in range(1, max(abs(delta_x), abs(delta_y)) + 1):
+            path.append(game_map.cell_position(from_cell + i * step))
+    return SearchResult(path, explored)
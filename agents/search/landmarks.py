@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+from agents.search.a_star import cell_octile_distance
+from agents.search.distance_field import build_grid_graph
+
+
+class Landmarks:
+    """
+    ALT preprocessing: the distances from a few landmark cells to every cell, on the static layer of a map.
+    By the triangle inequality |d(L, n) - d(L, goal)| never overestimates d(n, goal). Dynamic areas only block
+    cells, so the bound computed without them stays admissible on every instance of the map.
+
+    Landmarks are picked by farthest-point selection in the largest component, each one as far as possible from
+    those already picked. Distances are stored as float32, the bound is lowered by their rounding error.
+    """
+
+    def __init__(self, game_map, count=8):
+        self.stride = game_map.stride
+        passable = game_map.get_static_passable()
+        graph = build_grid_graph(game_map, passable)
+
+        cells = np.flatnonzero(passable.reshape(-1))
+        _, labels = connected_components(graph, directed=False)
+        largest = np.bincount(labels[cells]).argmax()
+        first_cell = cells[labels[cells] == largest][0]
+
+        self.cells = []
+        distances = []
+        closest = dijkstra(graph, indices=first_cell)
+        for _ in range(count):
+            # unreachable cells are infinitely far, they never become landmarks
+            landmark = int(np.argmax(np.where(np.isfinite(closest), closest, -1.0)))
+            landmark_distances = dijkstra(graph, indices=landmark)
+            self.cells.append(landmark)
+            distances.append(landmark_distances)
+            closest = landmark_distances if len(self.cells) == 1 else np.minimum(closest, landmark_distances)
+
+        distances = np.array(distances)
+        finite = np.isfinite(distances)
+        self.margin = 4 * np.finfo(np.float32).eps * (distances[finite].max() if finite.any() else 0.0)
+        self.distances = distances.astype(np.float32)
+        self._rows = [row.data for row in self.distances]  # fast item access from python, like Map.passable_cells
+
+    @property
+    def nbytes(self):
+        return self.distances.nbytes
+
+    def heuristic(self, game_map, goal):
+        """
+        Lower bound of the cost from a cell to goal, the best of the landmark bounds and the octile distance.
+        Returned as a function of a cell id for a_star_search, only the cells the search reaches are bounded.
+        """
+        goal_cell = game_map.cell_index(goal)
+        # Landmarks are all in the largest component. A goal out of it only has the octile bound, else the cells
+        # that can reach it are in it too and every landmark distance is finite.
+        landmarks = [] if self._rows[0][goal_cell] == math.inf else [(row, row[goal_cell]) for row in self._rows]
+        stride, margin = self.stride, self.margin
+
+        def estimate(cell):
+            bound = 0.0
+            for row, goal_distance in landmarks:
+                landmark_bound = abs(row[cell] - goal_distance)
+                if landmark_bound > bound:
+                    bound = landmark_bound
+
+            return max(bound - margin, cell_octile_distance(cell, goal_cell, stride))
+
+        return estimate
+
+def get_landmarks(game_map, count=8):
+    """Landmarks of the map as generated, built once and shared by every instance of the map."""
+    key = ("landmarks", count)
+    if key not in game_map.static_cache:
+        game_map.static_cache[key] = Landmarks(game_map, count)
+    return game_map.static_cache[key]
@@ -0,0 +1,6 @@
+from typing import NamedTuple
+
+
+class SearchResult(NamedTuple):
+    path: list  # (x, y) cells from start to goal, both included. Empty if the goal can't be reached.
+    explored: list  # (x, y) cells expanded by the search
@@ -0,0 +1,37 @@
+import argparse
+
+from config import load_config
+from benchmarks.planner_benchmark import compare_summaries, load_results, print_heuristics, run_benchmark, save_results
+
+
+def _parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the planners on fixed-seed maps.")
+    parser.add_argument("--config", type=str, default="configs/simple_generate_config.yaml", help="YAML config path")
+    parser.add_argument("--schema", type=str, default="configs/schemas/project_schema.yaml", help="YAML schema path")
+    parser.add_argument("--output", type=str, default="bench_output.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", type=str, default=None, help="Previous results to compare against")
+    parser.add_argument("--sizes", type=_parse_size, nargs="+", default=None, help="Map sizes, e.g. 50x40 200x160")
+    parser.add_argument("--densities", type=float, nargs="+", default=None, help="Static obstacle areas per 100 cells")
+    parser.add_argument("--agents", type=str, nargs="+", default=None, help="Agent types, all registered by default")
+    parser.add_argument("--maps", type=int, default=2, help="Maps generated per size and density")
+    parser.add_argument("--queries", type=int, default=10, help="Start/goal pairs per map")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per query, the best one is kept")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed of the first map of every scenario")
+    args = parser.parse_args()
+
+    load_config(args.config, args.schema)
+
+    results = run_benchmark(sizes=args.sizes, densities=args.densities, agent_types=args.agents,
+                            maps_per_scenario=args.maps, queries_per_map=args.queries, repeats=args.repeats,
+                            seed=args.seed)
+    save_results(results, args.output)
+    print_heuristics(results["heuristics"])
+    print(f"Results written to {args.output}")
+
+    if args.baseline is not None:
+        compare_summaries(load_results(args.baseline)["summary"], results["summary"])
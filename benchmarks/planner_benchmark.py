@@ -0,0 +1,221 @@
+import inspect
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+import config
+from agents.agent_factory import factory
+from agents.search.distance_field import distance_fields
+from agents.search.hpa import get_cluster_abstraction
+from agents.search.landmarks import get_landmarks
+from helpers.task_helpers import create_map, create_positions
+
+DEFAULT_SIZES = [(50, 40), (100, 80), (200, 160)]
+DEFAULT_DENSITIES = [0.5, 1.0, 2.0]  # static obstacle areas per 100 cells, the default map has 1.0
+# A* agents with another heuristic, their expansions are reported relative to the octile one
+HEURISTIC_VARIANTS = ("astar_alt", "astar_field")
+# Map preprocessing of the agents that build one, shared by every task on the map. Timed on its own, the plans of
+# these agents only pay for it on the first task of a map.
+PREPROCESSING = {
+    "astar_alt": get_landmarks,
+    "hpa": get_cluster_abstraction,
+}
+
+
+def get_benchmarked_agent_types():
+    """Registered agents that can be built from a start and a goal only (replay needs a trace)."""
+    agent_types = []
+    for name in factory.names():
+        parameters = inspect.signature(factory.create(name).func).parameters
+        if "start" in parameters and "goal" in parameters:
+            agent_types.append(name)
+    return agent_types
+
+
+def _make_scenario_map(seed, width, height, density):
+    map_config = dict(config.CONFIG["map"])
+    map_config.update(grid_width=width, grid_height=height, num_dynamic_areas=0,
+                      num_static_areas=int(round(density * width * height / 100)))
+    return create_map(seed, map_config)
+
+
+def _clear_planner_caches(game_map):
+    """Drop the data the planners share between tasks (distance fields, abstractions...), built again on demand."""
+    distance_fields.clear()
+    game_map.static_cache.clear()
+
+
+def _time_plan(agent_type, game_map, start, goal, repeats):
+    """
+    Best time of a plan with the shared caches cleared, so it pays for everything it needs, and of the same plan
+    again right after, when it finds what the first one left in the caches (warm_time).
+    """
+    best_time = best_warm_time = float("inf")
+    agent = None
+    for _ in range(repeats):
+        _clear_planner_caches(game_map)
+        agent = factory.create(agent_type, start=start, goal=goal)()
+        start_time = time.perf_counter()
+        agent._plan_path(game_map)
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+        warm_agent = factory.create(agent_type, start=start, goal=goal)()
+        start_time = time.perf_counter()
+        warm_agent._plan_path(game_map)
+        best_warm_time = min(best_warm_time, time.perf_counter() - start_time)
+
+    # tracemalloc slows everything down, so memory is measured on its own run
+    _clear_planner_caches(game_map)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    factory.create(agent_type, start=start, goal=goal)()._plan_path(game_map)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"wall_time": best_time, "warm_time": best_warm_time, "nodes_expanded": len(agent.explored),
+            "peak_memory": peak_memory}
+
+
+def _time_preprocessing(agent_type, game_map, repeats):
+    """Best time of the map preprocessing of an agent, built from cleared caches. None for agents without one."""
+    if agent_type not in PREPROCESSING:
+        return None
+
+    best_time = float("inf")
+    for _ in range(repeats):
+        _clear_planner_caches(game_map)
+        start_time = time.perf_counter()
+        PREPROCESSING[agent_type](game_map)
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return best_time
+
+
+def run_benchmark(sizes=None, densities=None, agent_types=None, maps_per_scenario=2, queries_per_map=10, repeats=3,
+                  seed=1234):
+    """
+    Time _plan_path of every agent on fixed-seed maps.
+
+    Returns:
+        dict with the run metadata, one record per (agent, map, query) and a summary per (agent, size, density).
+    """
+    sizes = sizes or DEFAULT_SIZES
+    densities = densities or DEFAULT_DENSITIES
+    agent_types = agent_types or get_benchmarked_agent_types()
+
+    records = []
+    for width, height in sizes:
+        for density in densities:
+            for map_number in range(maps_per_scenario):
+                map_seed = seed + map_number
+                game_map = _make_scenario_map(map_seed, width, height, density)
+                start_goal_pairs = create_positions(game_map, queries_per_map, seed=map_seed)
+                preprocess_times = {agent_type: _time_preprocessing(agent_type, game_map, repeats)
+                                    for agent_type in agent_types}
+                for query, positions in start_goal_pairs.items():
+                    for agent_type in agent_types:
+                        measure = _time_plan(agent_type, game_map, positions["start"], positions["goal"], repeats)
+                        measure["preprocess_time"] = preprocess_times[agent_type]
+                        print(f"{agent_type:>10} {width}x{height} density {density} map {map_seed} query {query}: "
+                              f"{measure['wall_time'] * 1000:.2f} ms ({measure['warm_time'] * 1000:.2f} ms warm), "
+                              f"{measure['nodes_expanded']} nodes")
+                        records.append({"agent_type": agent_type, "width": width, "height": height,
+                                        "density": density, "map_seed": map_seed, "query": query,
+                                        "start": list(positions["start"]), "goal": list(positions["goal"]),
+                                        **measure})
+
+    summary = summarize(records)
+    return {"meta": _get_metadata(seed, repeats), "records": records, "summary": summary,
+            "heuristics": compare_heuristics(summary)}
+
+
+def _get_metadata(seed, repeats):
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "seed": seed,
+        "repeats": repeats,
+    }
+
+
+def _group_key(record):
+    return f"{record['agent_type']}|{record['width']}x{record['height']}|{record['density']}"
+
+
+def summarize(records):
+    groups = {}
+    for record in records:
+        groups.setdefault(_group_key(record), []).append(record)
+
+    summary = {}
+    for key, group in groups.items():
+        times = [r["wall_time"] for r in group]
+        summary[key] = {
+            "queries": len(group),
+            "total_time": sum(times),
+            "median_time": statistics.median(times),
+            "total_warm_time": sum(r["warm_time"] for r in group),
+            "median_warm_time": statistics.median(r["warm_time"] for r in group),
+            "total_nodes_expanded": sum(r["nodes_expanded"] for r in group),
+            "max_peak_memory": max(r["peak_memory"] for r in group),
+        }
+        # the same time is recorded on every query of a map
+        preprocess_times = {(r["map_seed"], r["width"], r["height"]): r["preprocess_time"] for r in group
+                            if r.get("preprocess_time") is not None}
+        if preprocess_times:
+            summary[key]["median_preprocess_time"] = statistics.median(preprocess_times.values())
+    return summary
+
+
+def compare_heuristics(summary, reference="astar"):
+    """
+    Ratio of the expansions of every A* heuristic variant to the octile A* ones, per size and density, next to the
+    time of a query once the map is preprocessed and of the preprocessing itself.
+    """
+    comparison = {}
+    for key, group in summary.items():
+        agent_type, scenario = key.split("|", 1)
+        reference_group = summary.get(f"{reference}|{scenario}")
+        if agent_type in HEURISTIC_VARIANTS and reference_group and reference_group["total_nodes_expanded"]:
+            comparison[key] = {
+                "expansion_ratio": group["total_nodes_expanded"] / reference_group["total_nodes_expanded"],
+                "median_warm_time": group["median_warm_time"],
+                "median_preprocess_time": group.get("median_preprocess_time"),
+            }
+    return comparison
+
+
+def print_heuristics(comparison):
+    for key, group in sorted(comparison.items()):
+        preprocessing = ""
+        if group["median_preprocess_time"] is not None:
+            preprocessing = f", {group['median_preprocess_time'] * 1000:.2f} ms of preprocessing per map"
+        print(f"{key:>40}: {group['expansion_ratio']:.2f} of the octile expansions, "
+              f"{group['median_warm_time'] * 1000:.2f} ms per query{preprocessing}")
+
+
+def compare_summaries(baseline, current):
+    """Print the ratio current / baseline of the total time and expansions of every group present in both runs."""
+    for key in sorted(current.keys() & baseline.keys()):
+        old, new = baseline[key], current[key]
+        time_ratio = new["total_time"] / old["total_time"] if old["total_time"] else float("inf")
+        nodes_ratio = (new["total_nodes_expanded"] / old["total_nodes_expanded"]
+                       if old["total_nodes_expanded"] else float("inf"))
+        print(f"{key:>40}: time x{time_ratio:.2f}, nodes x{nodes_ratio:.2f}")
+
+
+def save_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=4)
+
+
+def load_results(path):
+    with open(path, "r") as f:
+        return json.load(f)
@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Headless runs and pool workers only need these, they must not pull a GUI toolkit.
+HEADLESS_MODULES = ["game_logic.game_loop", "helpers.task_helpers"]
+INTERACTIVE_MODULES = ["game_logic.interactive_loop"]
+GUI_MODULES = ["pygame", "tkinter"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_time": elapsed, "gui_modules": [m for m in {gui_modules} if m in sys.modules]}}))
+"""
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_startup(module, repeats=5):
+    """
+    Import a module in fresh interpreters and keep the fastest run.
+
+    Returns:
+        dict with the import time, the time of the whole process and the GUI modules that ended up imported.
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, gui_modules=GUI_MODULES)],
+                                   cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        process_time = time.perf_counter() - start
+        measure = json.loads(completed.stdout.strip().splitlines()[-1])
+        measure["process_time"] = process_time
+        if best is None or measure["process_time"] < best["process_time"]:
+            best = measure
+
+    best["module"] = module
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the startup cost of the headless and interactive entry points.")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per module, the fastest is kept")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = [measure_startup(module, args.repeats) for module in HEADLESS_MODULES + INTERACTIVE_MODULES]
+    for result in results:
+        gui_modules = ", ".join(result["gui_modules"]) or "none"
+        print(f"{result['module']:>30}: import {result['import_time'] * 1000:.1f} ms, "
+              f"process {result['process_time'] * 1000:.1f} ms, GUI modules: {gui_modules}")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    headless_with_gui = [r["module"] for r in results if r["module"] in HEADLESS_MODULES and r["gui_modules"]]
+    if headless_with_gui:
+        print(f"Headless modules importing a GUI toolkit: {headless_with_gui}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
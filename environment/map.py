@@ -1,10 +1,16 @@
+import copy
+import math
+
 import numpy as np
-from scipy.ndimage import binary_dilation
-import pygame
+from scipy.ndimage import binary_dilation, label
 
+from environment.map_delta import MapDelta
 from environment.obstacle import ObstacleArea
 from helpers.map_helpers import random_shape
 
+# Order in which neighbours are visited, planners tie-break on it.
+NEIGHBOR_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+
 
 class Map:
     def __init__(
@@ -33,6 +39,30 @@ class Map:
         self.grid = np.zeros((self.height, self.width), dtype=int)
         self.erosion = np.zeros((self.height, self.width), dtype=bool)
 
+        # The static layer never changes once generated and is shared by every instance of the map (see instantiate),
+        # only the dynamic areas are stamped on top of it every tick.
+        self._static_grid = None
+        self._static_erosion = None
+        self._dynamic_count = None  # overlapping areas stack up
+        self._stamped_offsets = []
+        self.last_delta = MapDelta()
+
+        # Traversability shared by all planners: column major with a blocked border of one cell all around, so cell
+        # (x, y) has the flat id (x + 1) * stride + (y + 1). Ids sort like (x, y) tuples and no bound check is needed.
+        self.stride = self.height + 2
+        self.passable = None
+        self.passable_cells = None  # flat view of passable with fast item access from python loops
+        # (cell offset, move cost) of the neighbours of a cell, every planner walks it inline
+        self.neighbor_table = [(dx * self.stride + dy, math.hypot(dx, dy)) for dx, dy in NEIGHBOR_DIRECTIONS]
+        # Labelled on demand and kept up to date by the updates that can't split a component. Components merged by
+        # freed cells keep their labels, _label_parents maps them to the label of the merged component.
+        self._component_labels = None
+        self._label_parents = None
+        # Replaced by a new token whenever passable changes, data derived from the grid is keyed on it (by identity).
+        self.revision = None
+        # Data derived from the map as generated (planner abstractions...), shared by reference by every instance.
+        self.static_cache = {}
+
         self.static_areas = []
         self.dynamic_areas = []
 
@@ -43,23 +73,141 @@ class Map:
             area.reset()
         self._rebuild_grid()
 
+    def instantiate(self):
+        """
+        Create a map to play on, sharing the static layer of this one.
+        Only the dynamic state is owned by the new map: clones of the dynamic areas reset to their initial offsets
+        and move patterns, and the grids built from them. Maps without dynamic areas never change, so they share
+        everything.
+        """
+        game_map = copy.copy(self)
+        if self.dynamic_areas:
+            game_map.dynamic_areas = [area.clone() for area in self.dynamic_areas]
+            game_map._rebuild_grid()
+        return game_map
+
     def update(self, agent_pos):
+        """
+        Move the dynamic areas one step.
+
+        Returns:
+            MapDelta: the cells that changed during this update, also kept in self.last_delta.
+        """
         self._update_dynamics(agent_pos)
-        self._rebuild_grid()
+        self.last_delta = self._restamp_dynamic_areas()
+        if self.last_delta:
+            self._apply_delta(self.last_delta)
+            self.revision = object()
+        return self.last_delta
+
+    def _apply_delta(self, delta):
+        """
+        Write the changed cells in passable. Freed cells can only merge components, the labels are kept and the
+        components around each of them are merged. A blocked cell may split its component, the labels are then
+        dropped and the next query labels the grid again.
+        """
+        rows, cols = delta.blocked
+        self.passable[cols + 1, rows + 1] = 0
+        if rows.size > 0:
+            self._component_labels = None
+
+        rows, cols = delta.freed
+        freed_cells = ((cols + 1) * self.stride + rows + 1).tolist()
+        passable = self.passable_cells
+        if self._component_labels is None:
+            for cell in freed_cells:
+                passable[cell] = 1
+            return
+
+        labels = self._component_labels.reshape(-1).data
+        parents = self._label_parents
+        for cell in freed_cells:
+            passable[cell] = 1
+            roots = {self._component_root(labels[cell + offset]) for offset, _ in self.neighbor_table
+                     if labels[cell + offset]}
+            if not roots:
+                parents.append(len(parents))
+                labels[cell] = len(parents) - 1
+                continue
+            root = min(roots)
+            for other in roots:
+                parents[other] = root
+            labels[cell] = root
+
+    def _component_root(self, component):
+        parents = self._label_parents
+        while parents[component] != component:
+            parents[component] = parents[parents[component]]
+            component = parents[component]
+        return component
+
+    def cell_index(self, pos):
+        x, y = pos
+        return (x + 1) * self.stride + y + 1
+
+    def cell_position(self, cell):
+        x, y = divmod(cell, self.stride)
+        return x - 1, y - 1
+
+    def is_passable(self, pos):
+        return self.passable_cells[self.cell_index(pos)] != 0
+
+    @property
+    def component_labels(self):
+        """
+        Connected component of every cell, same layout as passable. Blocked cells are 0 and moves go to the 8
+        neighbours like in the planners. Computed on first use after the map changed.
+        """
+        self._ensure_component_labels()
+        if any(parent != component for component, parent in enumerate(self._label_parents)):
+            roots = np.array([self._component_root(component) for component in range(len(self._label_parents))])
+            self._component_labels = roots[self._component_labels].astype(self._component_labels.dtype)
+            self._label_parents = list(range(len(self._label_parents)))
+        return self._component_labels
+
+    def _ensure_component_labels(self):
+        if self._component_labels is None:
+            self._component_labels, count = label(self.passable, structure=np.ones((3, 3), dtype=bool))
+            self._label_parents = list(range(count + 1))
+
+    def is_reachable(self, start, goal):
+        """
+        Check in O(1) that a path from start to goal exists on the current grid.
+        An agent standing on a blocked cell, when an area moved next to it, can still step to its free neighbours.
+        """
+        if tuple(start) == tuple(goal):
+            return True
+
+        self._ensure_component_labels()
+        labels = self._component_labels.reshape(-1)
+        goal_label = labels[self.cell_index(goal)]
+        if goal_label == 0:
+            return False
 
-    def draw(self, surface, cell_size):
-        for y in range(self.height):
-            for x in range(self.width):
-                rect = pygame.Rect(x * cell_size, y * cell_size, cell_size, cell_size)
-                if self.grid[y, x] == 1:
-                    pygame.draw.rect(surface, self.color_obstacle, rect)
-                elif self.erosion[y, x]:
-                    pygame.draw.rect(surface, self.color_erosion, rect)
+        goal_label = self._component_root(goal_label)
+        start_cell = self.cell_index(start)
+        if labels[start_cell]:
+            return self._component_root(labels[start_cell]) == goal_label
+        return any(labels[start_cell + offset] and self._component_root(labels[start_cell + offset]) == goal_label
+                   for offset, _ in self.neighbor_table)
 
-        for x in range(self.width):
-            pygame.draw.line(surface, self.color_grid_line, (x * cell_size, 0), (x * cell_size, self.height * cell_size))
-        for y in range(self.height):
-            pygame.draw.line(surface, self.color_grid_line, (0, y * cell_size), (self.width * cell_size, y * cell_size))
+    def get_static_passable(self):
+        """
+        Traversability of the static layer alone, same layout as passable. Dynamic areas only ever block cells, so
+        every cell traversable now is traversable there.
+        """
+        static_passable = np.zeros_like(self.passable)
+        static_passable[1:-1, 1:-1] = ((self._static_grid == 0) & ~self._static_erosion).T
+        return static_passable
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["passable_cells"]  # memoryviews can't be copied, it is rebuilt over the copied array
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.passable_cells = self.passable.reshape(-1).data
 
     def get_trace(self):
         map_trace = {
@@ -89,6 +237,7 @@ class Map:
             dx, dy = random_generator.choice([-1, 1]), random_generator.choice([-1, 1])
             self.dynamic_areas.append(ObstacleArea(shape, offset, move_pattern=(dx, dy)))
 
+        self._build_static_layer()
         self._rebuild_grid()
 
     def _update_dynamics(self, agent_pos):
@@ -132,24 +281,107 @@ class Map:
             area.set_move_pattern(new_dx, new_dy)
             area.execute_move(ox + new_dx, oy + new_dy)
 
+    def _build_static_layer(self):
+        static_grid = np.zeros((self.height, self.width), dtype=int)
+        static_grid[0, :] = 1
+        static_grid[-1, :] = 1
+        static_grid[:, 0] = 1
+        static_grid[:, -1] = 1
+
+        for area in self.static_areas:
+            static_grid[area.get_absolute_indices(self.width, self.height)] = 1
+
+        static_erosion = binary_dilation(static_grid, iterations=1)
+        # shared between instances, make sure nobody writes into it
+        static_grid.flags.writeable = False
+        static_erosion.flags.writeable = False
+        self._static_grid = static_grid
+        self._static_erosion = static_erosion
+
     def _rebuild_grid(self):
-        self.grid[:, :] = 0
-        self.grid[0, :] = 1
-        self.grid[-1, :] = 1
-        self.grid[:, 0] = 1
-        self.grid[:, -1] = 1
+        # always new arrays, the previous ones may be shared with another instance
+        self._dynamic_count = np.zeros((self.height, self.width), dtype=np.int32)
+        for area in self.dynamic_areas:
+            # cells of a single area are unique so a plain fancy-index increment is safe
+            self._dynamic_count[area.get_absolute_indices(self.width, self.height)] += 1
+        self._stamped_offsets = [area.offset for area in self.dynamic_areas]
+
+        dynamic_mask = self._dynamic_count > 0
+        self.grid = self._static_grid | dynamic_mask
+        # dilation distributes over union, so the static part can come from the cache
+        self.erosion = self._static_erosion | binary_dilation(dynamic_mask, iterations=1)
+        self.last_delta = MapDelta()
+        self.passable = np.zeros((self.width + 2, self.stride), dtype=np.uint8)
+        self.passable[1:-1, 1:-1] = ((self.grid == 0) & ~self.erosion).T
+        self.passable_cells = self.passable.reshape(-1).data
+        self._component_labels = None
+        self.revision = object()
+
+    def _restamp_dynamic_areas(self):
+        """
+        Move the stamps of the dynamic areas that moved since the last call and refresh only around them.
+
+        Returns:
+            MapDelta: the cells that changed, found by comparing the dirty regions before and after the refresh.
+        """
+        dirty_boxes = []
+        for index, area in enumerate(self.dynamic_areas):
+            old_offset = self._stamped_offsets[index]
+            if area.offset == old_offset:
+                continue
+
+            old_rows, old_cols = area.get_absolute_indices(self.width, self.height, old_offset)
+            new_rows, new_cols = area.get_absolute_indices(self.width, self.height)
+            self._dynamic_count[old_rows, old_cols] -= 1
+            self._dynamic_count[new_rows, new_cols] += 1
+            self._stamped_offsets[index] = area.offset
+
+            rows = np.concatenate((old_rows, new_rows))
+            cols = np.concatenate((old_cols, new_cols))
+            if rows.size > 0:
+                dirty_boxes.append((rows.min(), rows.max() + 1, cols.min(), cols.max() + 1))
+
+        if not dirty_boxes:
+            return MapDelta()
+
+        # erosion reaches one cell around the dirty box
+        eroded_boxes = [(max(top - 1, 0), min(bottom + 1, self.height), max(left - 1, 0), min(right + 1, self.width))
+                        for top, bottom, left, right in dirty_boxes]
+        previous = [self.erosion[top:bottom, left:right].copy() for top, bottom, left, right in eroded_boxes]
+
+        for top, bottom, left, right in dirty_boxes:
+            self.grid[top:bottom, left:right] = (self._static_grid[top:bottom, left:right] |
+                                                 (self._dynamic_count[top:bottom, left:right] > 0))
+
+        # the erosion of a box needs one more cell of context to be computed
+        for top, bottom, left, right in eroded_boxes:
+            context_top, context_left = max(top - 1, 0), max(left - 1, 0)
+            context_bottom, context_right = min(bottom + 1, self.height), min(right + 1, self.width)
+
+            dynamic_mask = self._dynamic_count[context_top:context_bottom, context_left:context_right] > 0
+            dilated = binary_dilation(dynamic_mask, iterations=1)
+            self.erosion[top:bottom, left:right] = (
+                self._static_erosion[top:bottom, left:right] |
+                dilated[top - context_top:bottom - context_top, left - context_left:right - context_left])
+
+        return self._collect_delta(eroded_boxes, previous)
 
-        for area in self.static_areas + self.dynamic_areas:
-            for x, y in area.get_absolute_positions():
-                if 0 <= x < self.width and 0 <= y < self.height:
-                    self.grid[y, x] = 1
+    def _collect_delta(self, boxes, previous):
+        changes = {"blocked": [], "freed": []}
+        for (top, bottom, left, right), old_erosion in zip(boxes, previous):
+            new_erosion = self.erosion[top:bottom, left:right]
+            # erosion always covers the obstacles, so it alone tells if a cell can be traversed
+            for name, mask in (("blocked", new_erosion & ~old_erosion),
+                               ("freed", old_erosion & ~new_erosion)):
+                rows, cols = np.nonzero(mask)
+                changes[name].append((rows + top) * self.width + cols + left)
 
-        self.erosion = binary_dilation(self.grid, iterations=1)
+        # boxes can overlap, np.unique removes the duplicated cells
+        return MapDelta(**{name: np.divmod(np.unique(np.concatenate(flat)), self.width)
+                           for name, flat in changes.items()})
 
     def get_free_positions(self):
-        free_positions = []
-        for y in range(1, self.height - 1):
-            for x in range(1, self.width - 1):
-                if self.grid[y, x] == 0 and not self.erosion[y, x]:
-                    free_positions.append((x, y))
-        return free_positions
+        """Return the (x, y) of every traversable cell as an (N, 2) array, in row-major order."""
+        # the border is always an obstacle, so it never shows up
+        ys, xs = np.divmod(np.flatnonzero((self.grid == 0) & ~self.erosion), self.width)
+        return np.column_stack((xs, ys))
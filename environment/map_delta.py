@@ -0,0 +1,37 @@
+import numpy as np
+
+_EMPTY_INDEX = np.empty(0, dtype=np.intp)
+
+
+class MapDelta:
+    """
+    Cells that changed during one map update. Every field is a (rows, cols) pair of index arrays, so it can be used
+    directly to index the map arrays (game_map.grid[delta.blocked]).
+
+    blocked / freed: cells that stopped / started being traversable, erosion included.
+    """
+
+    def __init__(self, blocked=None, freed=None):
+        self.blocked = blocked if blocked is not None else (_EMPTY_INDEX, _EMPTY_INDEX)
+        self.freed = freed if freed is not None else (_EMPTY_INDEX, _EMPTY_INDEX)
+
+    def __bool__(self):
+        return self.blocked[0].size > 0 or self.freed[0].size > 0
+
+    def __repr__(self):
+        return f"MapDelta(blocked={self.blocked[0].size}, freed={self.freed[0].size})"
+
+    @staticmethod
+    def _to_positions(index):
+        rows, cols = index
+        return list(zip(cols.tolist(), rows.tolist()))
+
+    def blocked_positions(self):
+        return self._to_positions(self.blocked)
+
+    def freed_positions(self):
+        return self._to_positions(self.freed)
+
+    def changed_positions(self):
+        """(x, y) of every cell whose traversability changed."""
+        return self.blocked_positions() + self.freed_positions()
@@ -1,3 +1,8 @@
+import copy
+
+import numpy as np
+
+
 class ObstacleArea:
     def __init__(self, cells: list[tuple[int, int]], offset: tuple[int, int] = (0, 0), move_pattern: tuple[int, int] = (0, 0)):
         self.cells = cells                                 # Relative cell positions (shape)
@@ -5,11 +10,20 @@ class ObstacleArea:
         self.initial_move_pattern = move_pattern           # Initial movement pattern (for reset)
         self.offset = offset                               # Current world offset (x, y)
         self.move_pattern = move_pattern                   # Current movement direction per step
+        self._cells_x, self._cells_y = np.array(cells, dtype=np.intp).reshape(-1, 2).T
 
     def get_absolute_positions(self) -> list[tuple[int, int]]:
         ox, oy = self.offset
         return [(x + ox, y + oy) for x, y in self.cells]
 
+    def get_absolute_indices(self, width: int, height: int, offset: tuple[int, int] | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Return (rows, cols) index arrays of the cells at the given offset (current one by default) inside the map."""
+        ox, oy = self.offset if offset is None else offset
+        xs = self._cells_x + ox
+        ys = self._cells_y + oy
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        return ys[inside], xs[inside]
+
     def set_move_pattern(self, dx: int, dy: int):
         self.move_pattern = (dx, dy)
 
@@ -25,5 +39,11 @@ class ObstacleArea:
         self.offset = self.initial_offset
         self.move_pattern = self.initial_move_pattern
 
+    def clone(self) -> "ObstacleArea":
+        """Copy sharing the shape with this area, reset to the initial offset and move pattern."""
+        area = copy.copy(self)
+        area.reset()
+        return area
+
     def copy_with_new_offset(self, offset: tuple[int, int]) -> "ObstacleArea":
         return ObstacleArea(self.cells, offset, self.move_pattern)
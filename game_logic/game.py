@@ -1,79 +1,110 @@
-import copy
+import time
+
 import config
-import pygame
+
+
+def make_map_trace(game_map, seed):
+    map_trace = game_map.get_trace()
+    map_trace["seed"] = seed
+    # kept as arrays, the trace writer decides how they are encoded
+    map_trace["grid"] = game_map.grid.copy()
+    map_trace["erosion"] = game_map.erosion.copy()
+    return map_trace
+
+
+def export_agent_trace(agent_trace, status):
+    """Keep the configured agent_export_fields of an agent trace and add its status."""
+    export_fields = config.CONFIG["agent_export_fields"]
+    if export_fields is None:
+        return {**agent_trace, **status}
+
+    # the status is always exported, failed tasks must be told apart from successful ones
+    filtered_agent_trace = {k: v for k, v in agent_trace.items() if k in export_fields}
+    return {**filtered_agent_trace, **status}
+
+
+def get_budget_failure(steps, planning_time, wall_time, max_steps=None, max_planning_time=None, max_wall_time=None):
+    """Reason a task is stopped for, the first budget it is over, or None while it is within all of them."""
+    if max_steps is not None and steps >= max_steps:
+        return "max_steps"
+    if max_planning_time is not None and planning_time > max_planning_time:
+        return "max_planning_time"
+    if max_wall_time is not None and wall_time > max_wall_time:
+        return "max_wall_time"
+    return None
 
 
 class Game:
     def __init__(self, task):
-        self.task = copy.deepcopy(task)
+        self.task = task
 
         self.update_interval = config.CONFIG["game"]["update_interval"]
+        self.max_steps = config.CONFIG["game"].get("max_steps")
+        self.max_planning_time = config.CONFIG["game"].get("max_planning_time")
+        self.max_wall_time = config.CONFIG["game"].get("max_wall_time")
         self.color_start = config.CONFIG["game"]["color_start"]
         self.color_goal = config.CONFIG["game"]["color_goal"]
         self.color_agent = config.CONFIG["game"]["color_agent"]
         self.cell_size = config.CONFIG["map"]["cell_size"]
 
-        self.gameplay_map = task.gameplay_map
+        self.gameplay_map = task.gameplay_map.instantiate()
         self.agent = None
         self.time_since_last_update = 0
+        self.steps = 0
+        self.failure_reason = None  # set when the task is stopped before reaching its goal
+        self.start_time = time.perf_counter()
 
-        self.map_trace = self.gameplay_map.get_trace()
-        self.map_trace["seed"] = task.seed
-        self.map_trace["grid"] = self.gameplay_map.grid.tolist()
-        self.map_trace["erosion"] = self.gameplay_map.erosion.tolist()
+        self.map_trace = make_map_trace(self.gameplay_map, task.seed)
 
         self._spawn_agent()
 
     def _spawn_agent(self):
         self.agent = self.task.agent()
 
+        # static maps never open a new path, there is no point in letting the agent try
+        if not self.gameplay_map.dynamic_areas and not self.gameplay_map.is_reachable(self.agent.start,
+                                                                                     self.agent.goal):
+            self.failure_reason = "unreachable"
+
         print(f"Agent: {self.agent.display_name}, Map #{self.task.map_index}, Spawn #{self.task.position_index}\n  Start: {self.agent.start} -> Goal: {self.agent.goal}")
 
     def update(self, delta_time):
         self.time_since_last_update += delta_time
         if self.time_since_last_update >= self.update_interval:
-            self.time_since_last_update = 0
-            self.gameplay_map.update(self.agent.position)
-            self.agent.update(self.gameplay_map)
+            self.step()
+
+    def step(self):
+        """
+        Advance the game by exactly one update interval, regardless of the elapsed real time.
+        This is the simulated clock used by headless runs.
+        """
+        self.time_since_last_update = 0
+        self.gameplay_map.update(self.agent.position)
+        self.agent.update(self.gameplay_map)
+        self.steps += 1
+
+    def _check_budgets(self):
+        return get_budget_failure(self.steps, self.agent.total_planning_time, time.perf_counter() - self.start_time,
+                                  self.max_steps, self.max_planning_time, self.max_wall_time)
 
     def is_task_completed(self):
-        return self.agent.has_reached_goal()
+        """A task is over when the agent reached its goal, or failed because it is impossible or over budget."""
+        if self.failure_reason is None and not self.agent.has_reached_goal():
+            self.failure_reason = self._check_budgets()
+        return self.failure_reason is not None or self.agent.has_reached_goal()
 
     def get_trace(self):
         agent_trace = {"spawn_index": self.task.position_index, "map_index": self.task.map_index}
         agent_state = self.agent.update_and_get_state()
         agent_trace.update(agent_state)
+        # a failed task keeps whatever it gathered until it was stopped
+        status = {"status": "failed" if self.failure_reason is not None else "success",
+                  "failure_reason": self.failure_reason, "steps": self.steps,
+                  "wall_time": time.perf_counter() - self.start_time}
 
         print("\t\tpath length" ,agent_state["path_length"])
         print("\t\tvisited path nodes count", len(self.agent.visited))
         print("\t\texplored path nodes count", len(self.agent.explored))
-        filtered_agent_trace = {k: v for k, v in agent_trace.items() if k in config.CONFIG["agent_export_fields"]}
-        return filtered_agent_trace, self.map_trace
-
-    def draw(self, surface):
-        self.agent.draw(surface)
-        self.gameplay_map.draw(surface, self.cell_size)
-
-        # Draw goal
-        gx, gy = self.agent.goal
-        pygame.draw.rect(
-            surface,
-            self.color_goal,
-            pygame.Rect(gx * self.cell_size, gy * self.cell_size, self.cell_size, self.cell_size)
-        )
-
-        # Draw agent
-        ax, ay = self.agent.position
-        pygame.draw.rect(
-            surface,
-            self.color_agent,
-            pygame.Rect(ax * self.cell_size, ay * self.cell_size, self.cell_size, self.cell_size)
-        )
-
-        # Draw start
-        gx, gy = self.agent.start
-        pygame.draw.rect(
-            surface,
-            self.color_start,
-            pygame.Rect(gx * self.cell_size, gy * self.cell_size, self.cell_size, self.cell_size)
-        )
+        if self.failure_reason is not None:
+            print("\t\tfailed:", self.failure_reason, "after", self.steps, "steps")
+        return export_agent_trace(agent_trace, status), self.map_trace
@@ -1,103 +1,35 @@
-import pygame
+import math
 import time
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from debug.debug_window import debug_queue, toggle_debug_window
-from game_logic.game import Game
-from helpers.log_helpers import export_runtime_data
-from helpers.task_helpers import create_tasks
+import config as config_module
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from agents.batch import ENGINES, plan_many
+from game_logic.game import Game, export_agent_trace, get_budget_failure, make_map_trace
+from helpers.log_helpers import create_output_dir, export_config
+from helpers.path_helper import compute_path_length
+from helpers.task_helpers import (build_task, compute_config_hash, create_task_descriptors, get_map,
+                                  get_map_and_positions, get_task_key)
+from helpers.trace_helpers import TraceWriter
 from tqdm import tqdm
 
 
-def interactive_main_loop(config):
-    agent_traces = []
-    map_traces = {}
+def run_task(task, fps, simulated_clock=True):
+    """
+    Run a single task until the agent reaches its goal, or the game stops it (see Game.is_task_completed).
 
-    index = 0
-    tasks = create_tasks(agent_traces)
-    if len(tasks) == 0:
-        return
-
-    pygame.init()
-    screen = pygame.display.set_mode((config["map"]["grid_width"] * config["map"]["cell_size"],
-                                      config["map"]["grid_height"] * config["map"]["cell_size"]))
-    pygame.display.set_caption("Map Generator & Path Planning Experiment")
-    clock = pygame.time.Clock()
-
-    task = tasks[index]
+    With the simulated clock, the game advances by one update interval per step without sleeping, so the run is
+    only bound by the CPU. Otherwise the loop is throttled to the requested fps like the interactive loop.
+    """
     game = Game(task)
 
-    fps = config["fps"]
-    background_color = config["color_background"]
-    record_trace = config["record_trace"]
-
-    debug_enabled = False
-    running = True
-    paused = False
-    previous_time = pygame.time.get_ticks()
-    while running:
-        delta_time = 0
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_x:
-                    game = Game(game.task)
-                elif event.key == pygame.K_d:
-                    toggle_debug_window()
-                    debug_enabled = not debug_enabled
-                elif event.key == pygame.K_p:
-                    if paused:
-                        paused = False
-                        previous_time = pygame.time.get_ticks()
-                    else:
-                        paused = True
-                elif event.key == pygame.K_s:
-                    if paused:
-                        delta_time = game.update_interval
-        if debug_enabled:
-            debug_queue.put(game.agent.update_and_get_state())
-        if not paused:
-            now = pygame.time.get_ticks()
-            delta_time = now - previous_time
-            previous_time = now
-
-        game.update(delta_time)
-        screen.fill(background_color)
-        game.draw(screen)
-        pygame.display.flip()
-        clock.tick(fps)
-
-        if game.is_task_completed():
-            if record_trace:
-                agent_trace, map_trace = game.get_trace()
-                map_traces[tasks[index].map_index] = map_trace
-                agent_traces.append(agent_trace)
-
-            index += 1
-            if index < len(tasks):
-                task = tasks[index]
-
-                game = Game(task)
-            else:
-                running = False
-
-    if record_trace:
-        name = config["experiment_name"]
-        output_folder = config["output_folder"]
-        export_runtime_data(name, output_folder, agent_traces, map_traces)
-
-    pygame.quit()
-
-
-def run_task(task, fps):
-    game = Game(task)
-    interval = 1.0 / fps
-
-    while not game.is_task_completed():
-        game.update(time.time() * 1000)
-        time.sleep(interval)
+    if simulated_clock:
+        while not game.is_task_completed():
+            game.step()
+    else:
+        interval = 1.0 / fps
+        while not game.is_task_completed():
+            game.update(time.time() * 1000)
+            time.sleep(interval)
 
     agent_trace, map_trace = game.get_trace()
     return {
@@ -106,33 +38,178 @@ def run_task(task, fps):
         "map_trace": map_trace,
     }
 
-def run_experiments_parallel(config, max_workers=4):
-    agent_traces = []
-    tasks = create_tasks(agent_traces)
-    if not tasks:
-        print("No tasks to run.")
-        return
+def _is_batchable(descriptor):
+    """
+    Tasks of agents that plan once and follow their plan, on a map that never changes. The time budgets depend on
+    how long the Game itself runs, tasks that have one are left to it.
+    """
+    if descriptor.trace is not None or descriptor.agent_type not in ENGINES:
+        return False
+    game_config = config_module.CONFIG["game"]
+    if game_config.get("max_planning_time") is not None or game_config.get("max_wall_time") is not None:
+        return False
+    return not get_map(descriptor.seed, descriptor.map_config).dynamic_areas
+
+
+def _get_batch_agent_trace(descriptor, start, goal, path, explored, planning_time):
+    """
+    Trace of a task planned by plan_many, as a Game would have recorded it: the agent plans on its first step and
+    follows its plan one cell per step, the game checks the step budget before each step (see Game.is_task_completed).
+    """
+    max_steps = config_module.CONFIG["game"].get("max_steps")
+    visited = []
+    failure_reason = None
+    if tuple(start) == tuple(goal):
+        explored, planning_time = [], 0.0  # spawned on its goal, the agent never plans
+    elif not path:
+        explored, planning_time = [], 0.0  # the game fails it at spawn, the agent never plans
+        failure_reason = "unreachable"
+    else:
+        plan = path[1:] if ENGINES[descriptor.agent_type].drops_start else path
+        while not visited or tuple(visited[-1]) != tuple(goal):
+            # batched tasks have no time budget (see _is_batchable), only the steps can stop them
+            failure_reason = get_budget_failure(len(visited), 0.0, 0.0, max_steps=max_steps)
+            if failure_reason is not None:
+                break
+            visited.append(plan[len(visited)])
+
+    agent_trace = {"spawn_index": descriptor.position_index, "map_index": descriptor.map_index,
+                   "agent_type": descriptor.agent_type, "start_pos": tuple(start), "goal_pos": tuple(goal),
+                   "planning_time": planning_time, "path_length": compute_path_length(visited),
+                   "agent_visited": visited, "agent_explored": list(set(explored))}
+    status = {"status": "failed" if failure_reason is not None else "success", "failure_reason": failure_reason,
+              "steps": len(visited), "wall_time": planning_time}
+    return export_agent_trace(agent_trace, status)
+
+
+def _run_static_batch(indexed_descriptors):
+    """
+    Run the tasks of static maps with a plan_many call per map and agent type, instead of stepping a Game.
+
+    Returns:
+        dict of the task results by index of their descriptor.
+    """
+    groups = {}
+    for index, descriptor in indexed_descriptors:
+        groups.setdefault((descriptor.seed, descriptor.agent_type), []).append((index, descriptor))
+
+    results = {}
+    for (map_seed, agent_type), group in groups.items():
+        try:
+            game_map, start_goal_pairs = get_map_and_positions(map_seed, group[0][1].map_config)
+            pairs = [(start_goal_pairs[d.position_index]["start"], start_goal_pairs[d.position_index]["goal"])
+                     for _, d in group]
+            paths, stats = plan_many(game_map, pairs, engine=agent_type, keep_explored=True)
+        except Exception as e:
+            print(f"Tasks of agent {agent_type} on map {map_seed} failed with exception: {e}")
+            continue
+
+        map_trace = make_map_trace(game_map, map_seed)
+        for query, (index, descriptor) in enumerate(group):
+            start, goal = pairs[query]
+            agent_trace = _get_batch_agent_trace(descriptor, start, goal, paths[query], stats["explored"][query],
+                                                 stats["planning_times"][query])
+            results[index] = {"map_index": descriptor.map_index, "agent_trace": agent_trace, "map_trace": map_trace}
+    return results
+
+# maps whose trace this worker already sent back, the writer only needs each map once
+_sent_map_indices = set()
+
+
+def _init_worker(project_config):
+    # workers may be spawned rather than forked, so the config has to be installed explicitly
+    config_module.CONFIG = project_config
+
+
+def _run_descriptors(descriptors, fps, simulated_clock, config_hash, batch_static=False):
+    batched = {}
+    if batch_static:
+        batched = _run_static_batch([(i, d) for i, d in enumerate(descriptors) if _is_batchable(d)])
 
-    fps = config["fps"]
     results = []
-    print(f"Running {len(tasks)} tasks using {max_workers} workers...")
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(run_task, task, fps) for task in tasks]
-
-        for future in tqdm(as_completed(futures), total=len(futures)):
+    for index, descriptor in enumerate(descriptors):
+        if index in batched:
+            result = batched[index]
+        else:
             try:
-                results.append(future.result())
+                result = run_task(build_task(descriptor), fps, simulated_clock)
             except Exception as e:
-                print(f"Task failed with exception: {e}")
-
-    # Group traces
-    map_traces = {}
-
-    for result in results:
-        map_traces[result["map_index"]] = result["map_trace"]
-        agent_traces.append(result["agent_trace"])
-
-    name = config["experiment_name"]
-    output_folder = config["output_folder"]
-    export_runtime_data(name, output_folder, agent_traces, map_traces)
\ No newline at end of file
+                print(f"Task {descriptor} failed with exception: {e}")
+                continue
+
+        result["task_key"] = get_task_key(descriptor, config_hash)
+
+        if result["map_index"] in _sent_map_indices:
+            result["map_trace"] = None
+        _sent_map_indices.add(result["map_index"])
+        results.append(result)
+    return results
+
+
+def _chunk_descriptors(descriptors, chunk_size):
+    # descriptors are grouped by map, so consecutive chunks let a worker reuse the map it just generated
+    return [descriptors[i:i + chunk_size] for i in range(0, len(descriptors), chunk_size)]
+
+
+def run_experiments_parallel(config, max_workers=4, simulated_clock=True, chunk_size=None, resume_dir=None,
+                             batch_static=False):
+    """
+    Run every task of the config in a process pool and stream the traces to a new output folder.
+
+    With resume_dir, the traces are appended to that folder instead and the tasks it already holds a trace of, run
+    with the same config, are skipped.
+
+    With batch_static, the tasks of maps without dynamic areas whose agent has a batch engine (see agents.batch)
+    are planned together by plan_many instead of being stepped tick by tick. Their traces are the same, except
+    for the timings.
+    """
+    descriptors = create_task_descriptors()
+    config_hash = compute_config_hash()
+
+    if resume_dir is None:
+        output_dir = create_output_dir(config["experiment_name"], config["output_folder"])
+        export_config(output_dir)
+    else:
+        output_dir = resume_dir
+
+    with TraceWriter(output_dir, compression=config["trace_compression"],
+                     trace_format=config["trace_format"]) as trace_writer:
+        if resume_dir is not None:
+            other_configs = {key[3] for key in trace_writer.completed_tasks} - {config_hash}
+            if other_configs:
+                print(f"Warning: {output_dir} holds tasks run with a different config, they are not reused")
+            total = len(descriptors)
+            descriptors = [d for d in descriptors
+                           if get_task_key(d, config_hash) not in trace_writer.completed_tasks]
+            print(f"Resuming {output_dir}: {total - len(descriptors)} of {total} tasks already completed")
+
+        if not descriptors:
+            print("No tasks to run.")
+            return
+
+        fps = config["fps"]
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(len(descriptors) / (max_workers * 4)))
+        chunks = _chunk_descriptors(descriptors, chunk_size)
+        print(f"Running {len(descriptors)} tasks in {len(chunks)} chunks using {max_workers} worker processes...")
+
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(config,)) as executor:
+            futures = {executor.submit(_run_descriptors, chunk, fps, simulated_clock, config_hash, batch_static): len(chunk)
+                       for chunk in chunks}
+
+            with tqdm(total=len(descriptors)) as progress:
+                for future in as_completed(futures):
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        print(f"Chunk failed with exception: {e}")
+                        results = []
+
+                    # traces are written as soon as they arrive, a crash later on does not lose them
+                    for result in results:
+                        if result["map_trace"] is not None:
+                            trace_writer.write_map_trace(result["map_index"], result["map_trace"])
+                        trace_writer.write_agent_trace(result["agent_trace"], task_key=result["task_key"])
+                    progress.update(futures[future])
+
+    print(f"Traces written to {output_dir}")
@@ -0,0 +1,94 @@
+import pygame
+
+from debug.debug_window import debug_queue, toggle_debug_window
+from game_logic.game import Game
+from helpers.log_helpers import create_output_dir, export_config
+from helpers.task_helpers import create_tasks
+from helpers.trace_helpers import TraceWriter
+from rendering.renderer import draw_game
+
+
+def interactive_main_loop(config):
+    agent_traces = []
+
+    index = 0
+    tasks = create_tasks(agent_traces)
+    if len(tasks) == 0:
+        return
+
+    pygame.init()
+    screen = pygame.display.set_mode((config["map"]["grid_width"] * config["map"]["cell_size"],
+                                      config["map"]["grid_height"] * config["map"]["cell_size"]))
+    pygame.display.set_caption("Map Generator & Path Planning Experiment")
+    clock = pygame.time.Clock()
+
+    task = tasks[index]
+    game = Game(task)
+
+    fps = config["fps"]
+    background_color = config["color_background"]
+    record_trace = config["record_trace"]
+    trace_writer = None
+    if record_trace:
+        output_dir = create_output_dir(config["experiment_name"], config["output_folder"])
+        export_config(output_dir)
+        trace_writer = TraceWriter(output_dir, compression=config["trace_compression"],
+                                   trace_format=config["trace_format"])
+
+    debug_enabled = False
+    running = True
+    paused = False
+    previous_time = pygame.time.get_ticks()
+    while running:
+        delta_time = 0
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_x:
+                    game = Game(game.task)
+                elif event.key == pygame.K_d:
+                    toggle_debug_window()
+                    debug_enabled = not debug_enabled
+                elif event.key == pygame.K_p:
+                    if paused:
+                        paused = False
+                        previous_time = pygame.time.get_ticks()
+                    else:
+                        paused = True
+                elif event.key == pygame.K_s:
+                    if paused:
+                        delta_time = game.update_interval
+        if debug_enabled:
+            debug_queue.put(game.agent.update_and_get_state())
+        if not paused:
+            now = pygame.time.get_ticks()
+            delta_time = now - previous_time
+            previous_time = now
+
+        game.update(delta_time)
+        screen.fill(background_color)
+        draw_game(screen, game)
+        pygame.display.flip()
+        clock.tick(fps)
+
+        if game.is_task_completed():
+            if record_trace:
+                agent_trace, map_trace = game.get_trace()
+                trace_writer.write_map_trace(tasks[index].map_index, map_trace)
+                trace_writer.write_agent_trace(agent_trace)
+                agent_traces.append(agent_trace)
+
+            index += 1
+            if index < len(tasks):
+                task = tasks[index]
+
+                game = Game(task)
+            else:
+                running = False
+
+    if trace_writer is not None:
+        trace_writer.close()
+
+    pygame.quit()
@@ -1,4 +1,4 @@
-import copy
+from typing import NamedTuple
 
 
 class TaskSpec:
@@ -6,5 +6,18 @@ class TaskSpec:
         self.seed = seed
         self.position_index = position_index
         self.map_index = map_index
-        self.gameplay_map = copy.deepcopy(game_map)
-        self.agent = agent
\ No newline at end of file
+        self.gameplay_map = game_map  # shared by every task on this map, games play on an instance of it
+        self.agent = agent
+
+
+class TaskDescriptor(NamedTuple):
+    """
+    Lightweight description of a task that can be shipped to worker processes.
+    The map and the agent are rebuilt on the worker side from these values.
+    """
+    seed: int
+    map_index: int
+    position_index: int
+    agent_type: str
+    map_config: dict | None = None  # None means config.CONFIG["map"]
+    trace: dict | None = None  # only used by replay tasks
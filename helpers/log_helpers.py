@@ -1,25 +1,22 @@
 import config
 import json
+import numpy as np
 import os
 import yaml
 
 from datetime import datetime
+from helpers.trace_helpers import PackedGrid, iter_agent_traces, iter_map_traces, pack_grid
 
 
-def export_runtime_data(name, output_folder,agent_traces, map_traces, export_config=True):
+def create_output_dir(name, output_folder):
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     output_dir = os.path.join(output_folder, name + "-" + timestamp)
     os.makedirs(output_dir, exist_ok=True)
+    return output_dir
 
-    with open(os.path.join(output_dir, "agent_output.json"), "w") as f:
-        json.dump(agent_traces, f, indent=4)
-
-    with open(os.path.join(output_dir, "map_output.json"), "w") as f:
-        json.dump(map_traces, f, indent=4)
-
-    if export_config:
-        with open(os.path.join(output_dir, "used_config.yaml"), "w") as f:
-            yaml.dump(config.CONFIG, f, default_flow_style=False, sort_keys=False)
+def export_config(output_dir):
+    with open(os.path.join(output_dir, "used_config.yaml"), "w") as f:
+        yaml.dump(config.CONFIG, f, default_flow_style=False, sort_keys=False)
 
 def load_json_file(path):
     with open(path, "r") as f:
@@ -27,58 +24,63 @@ def load_json_file(path):
 
 # ---------- Agent output comparison ----------
 
+def normalize_path(path, ordered=True):
+    """Bytes of a path as int32 (N, 2), so json lists and binary arrays compare equal."""
+    path = np.asarray(path, dtype=np.int32).reshape(-1, 2)
+    if not ordered:
+        path = path[np.lexsort((path[:, 1], path[:, 0]))]
+    return path.tobytes()
+
 def normalize_agent_entry(entry):
     return {
         "agent_type": entry["agent_type"],
         "spawn_index": entry["spawn_index"],
         "map_index": entry["map_index"],
-        "agent_visited": entry["agent_visited"],  # order matters
-        "agent_explored": sorted(entry["agent_explored"]),  # order doesn't matter
+        "agent_visited": normalize_path(entry["agent_visited"]),  # order matters
+        # order doesn't matter, may not be exported
+        "agent_explored": normalize_path(entry.get("agent_explored", []), ordered=False),
     }
 
 def sort_agent_key(entry):
     return (entry["map_index"], entry["spawn_index"], entry["agent_type"])
 
-def load_and_normalize_agents(path):
-    data = load_json_file(path)
-    normalized = [normalize_agent_entry(e) for e in data]
+def load_and_normalize_agents(folder):
+    normalized = [normalize_agent_entry(e) for e in iter_agent_traces(folder)]
     return sorted(normalized, key=sort_agent_key)
 
-def compare_agent_outputs(path1, path2):
-    data1 = load_and_normalize_agents(path1)
-    data2 = load_and_normalize_agents(path2)
+def compare_agent_outputs(folder1, folder2):
+    data1 = load_and_normalize_agents(folder1)
+    data2 = load_and_normalize_agents(folder2)
     return data1 == data2
 
 # ---------- Map output comparison ----------
 
+def normalize_grid(grid):
+    """Shape and packed bits of a grid, binary traces are compared straight from the memory-mapped bits."""
+    if not isinstance(grid, PackedGrid):
+        grid = pack_grid(grid)
+    return tuple(grid.shape), grid.bits.tobytes()
+
 def normalize_map_entry(index, entry):
     return {
         "map_index": int(index),
         "map_seed": entry["seed"],
-        "grid": entry["grid"],
-        "erosion": entry["erosion"],
-        "agent_type": entry["agent_type"],
+        "grid": normalize_grid(entry["grid"]),
+        "erosion": normalize_grid(entry["erosion"]),
     }
 
-def load_and_normalize_maps(path):
-    data = load_json_file(path)
-    normalized = [normalize_map_entry(k, v) for k, v in data.items()]
+def load_and_normalize_maps(folder):
+    normalized = [normalize_map_entry(k, v) for k, v in iter_map_traces(folder, packed=True)]
     return sorted(normalized, key=lambda x: x["map_index"])
 
-def compare_map_outputs(path1, path2):
-    data1 = load_and_normalize_maps(path1)
-    data2 = load_and_normalize_maps(path2)
+def compare_map_outputs(folder1, folder2):
+    data1 = load_and_normalize_maps(folder1)
+    data2 = load_and_normalize_maps(folder2)
     return data1 == data2
 
 # ---------- Final function comparing both folders ----------
 
 def compare_experiment_folders(folder1, folder2):
-    agent_equal = compare_agent_outputs(
-        os.path.join(folder1, "agent_output.json"),
-        os.path.join(folder2, "agent_output.json")
-    )
-    map_equal = compare_map_outputs(
-        os.path.join(folder1, "map_output.json"),
-        os.path.join(folder2, "map_output.json")
-    )
+    agent_equal = compare_agent_outputs(folder1, folder2)
+    map_equal = compare_map_outputs(folder1, folder2)
     return agent_equal and map_equal
\ No newline at end of file
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+
+import orjson
+
+# Bump when the generation or the layout of the cached objects changes, older entries are then never hit again.
+CACHE_VERSION = 6
+
+
+class MapCache:
+    """
+    Two level cache of generated content. Entries are content-addressed: the key is a hash of everything the content
+    is generated from, so an entry never needs to be invalidated.
+
+    The last max_entries entries are kept in memory, and when a folder is given every entry is also pickled there,
+    so later runs and other processes load it instead of generating it again.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def make_key(*parts):
+        content = orjson.dumps([CACHE_VERSION, *parts], option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        return hashlib.sha1(content).hexdigest()
+
+    def get(self, key, build, folder=None):
+        """Return the entry of key, calling build() to create it when neither memory nor folder holds it."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        value = self._load(key, folder)
+        if value is None:
+            value = build()
+            self._save(key, value, folder)
+
+        self._entries[key] = value
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    @staticmethod
+    def _path(key, folder):
+        return os.path.join(folder, key[:2], key + ".pkl")
+
+    def _load(self, key, folder):
+        if folder is None:
+            return None
+
+        try:
+            with open(self._path(key, folder), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (EOFError, pickle.UnpicklingError):
+            # a broken entry is regenerated and overwritten
+            return None
+
+    def _save(self, key, value, folder):
+        if folder is None:
+            return
+
+        path = self._path(key, folder)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # several workers can generate the same entry, the rename makes sure readers never see a partial file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
@@ -0,0 +1,111 @@
+class IndexedPriorityQueue:
+    """
+    Binary min-heap where every item appears at most once and knows its position in the heap.
+    This gives O(log n) push, update and remove, and O(1) contains, for any hashable item (cells for our planners).
+    Items with the same priority are ordered by the item itself, like a heap of (priority, item) tuples would.
+    """
+
+    def __init__(self):
+        self._heap = []  # list of (priority, item)
+        self._positions = {}  # item -> index in self._heap
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __bool__(self):
+        return bool(self._heap)
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def clear(self):
+        self._heap.clear()
+        self._positions.clear()
+
+    def priority(self, item):
+        return self._heap[self._positions[item]][0]
+
+    def peek(self):
+        """Return (priority, item) with the smallest priority without removing it."""
+        return self._heap[0]
+
+    def push(self, item, priority):
+        """Insert the item, or change its priority if it is already queued."""
+        index = self._positions.get(item)
+        if index is None:
+            self._heap.append((priority, item))
+            self._positions[item] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+            return
+
+        old_priority = self._heap[index][0]
+        self._heap[index] = (priority, item)
+        if priority < old_priority:
+            self._sift_up(index)
+        else:
+            self._sift_down(index)
+
+    update = push
+
+    def pop(self):
+        """Remove and return (priority, item) with the smallest priority."""
+        entry = self._heap[0]
+        self._remove_at(0)
+        return entry
+
+    def remove(self, item):
+        """Remove the item if it is queued. Returns True if something was removed."""
+        index = self._positions.get(item)
+        if index is None:
+            return False
+
+        self._remove_at(index)
+        return True
+
+    def _remove_at(self, index):
+        heap = self._heap
+        del self._positions[heap[index][1]]
+        last = heap.pop()
+        if index == len(heap):
+            return
+
+        heap[index] = last
+        self._positions[last[1]] = index
+        self._sift_up(index)
+        self._sift_down(self._positions[last[1]])
+
+    def _sift_up(self, index):
+        heap = self._heap
+        positions = self._positions
+        entry = heap[index]
+        while index > 0:
+            parent_index = (index - 1) >> 1
+            parent = heap[parent_index]
+            if not entry < parent:
+                break
+            heap[index] = parent
+            positions[parent[1]] = index
+            index = parent_index
+        heap[index] = entry
+        positions[entry[1]] = index
+
+    def _sift_down(self, index):
+        heap = self._heap
+        positions = self._positions
+        size = len(heap)
+        entry = heap[index]
+        while True:
+            child_index = 2 * index + 1
+            if child_index >= size:
+                break
+            right_index = child_index + 1
+            if right_index < size and heap[right_index] < heap[child_index]:
+                child_index = right_index
+            child = heap[child_index]
+            if not child < entry:
+                break
+            heap[index] = child
+            positions[child[1]] = index
+            index = child_index
+        heap[index] = entry
+        positions[entry[1]] = index
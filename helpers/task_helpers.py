@@ -1,8 +1,8 @@
-import orjson
-import os
 from functools import partial
 
+import hashlib
 import numpy as np
+import orjson
 import random
 
 from tqdm import tqdm
@@ -11,36 +11,44 @@ import config
 from agents.agent_factory import factory
 from agents.replay_agent import ReplayAgent
 from environment.map import Map
-from game_logic.task_spec import TaskSpec
-
-
-def find_start_and_goal_positions(spawns_per_map, free_positions):
-    max_attempts = 250
-    spawn_data = {}
-    used_pairs = set()
-
-    for i in range(spawns_per_map):
-        attempts = 0
-        while attempts < max_attempts:
-            # Randomly select start and goal from free positions
-            start_idx, goal_idx = np.random.choice(len(free_positions), 2, replace=False)
-            start = free_positions[start_idx]
-            goal = free_positions[goal_idx]
-
-            # Create a unique key for this pair (order matters)
-            pair_key = (start, goal)
-
-            if pair_key not in used_pairs:
-                used_pairs.add(pair_key)
-                spawn_data[i] = {"start": start, "goal": goal}
-                break
-
-            attempts += 1
-        else:
-            print(f"Warning: Could not find unique start-goal pair after {max_attempts} attempts")
-            break
-
-    return spawn_data
+from game_logic.task_spec import TaskDescriptor, TaskSpec
+from helpers.map_cache import MapCache
+from helpers.trace_helpers import iter_agent_traces, iter_map_traces
+
+
+def find_start_and_goal_positions(spawns_per_map, free_positions, rng, components=None):
+    """
+    Draw unique ordered (start, goal) pairs of distinct free positions in a single batch.
+
+    Every pair is encoded as an integer k in [0, n * (n - 1)): the start is the k // (n - 1)-th free position and the
+    goal the k % (n - 1)-th of the others, so drawing k without replacement gives unique pairs without retries. With
+    components, one label per free position, pairs are only drawn inside a component: component c owns a range of
+    n_c * (n_c - 1) keys.
+    """
+    free_positions = np.asarray(free_positions).reshape(-1, 2)
+    if components is None:
+        # a single group holding every free position, no need to sort them by label
+        n = len(free_positions)
+        pair_count = max(n * (n - 1), 0)
+        keys = rng.choice(pair_count, size=min(spawns_per_map, pair_count), replace=False)
+        start_rows, goal_rows = np.divmod(keys, max(n - 1, 1))
+        goal_rows += goal_rows >= start_rows  # skip the start itself
+    else:
+        order = np.argsort(components, kind="stable")
+        _, group_starts, group_sizes = np.unique(components[order], return_index=True, return_counts=True)
+        pair_offsets = np.concatenate(([0], np.cumsum(group_sizes * (group_sizes - 1))))
+
+        keys = rng.choice(int(pair_offsets[-1]), size=min(spawns_per_map, int(pair_offsets[-1])), replace=False)
+        groups = np.searchsorted(pair_offsets, keys, side="right") - 1
+        local_keys = keys - pair_offsets[groups]
+        start_indices, goal_indices = np.divmod(local_keys, group_sizes[groups] - 1)
+        goal_indices += goal_indices >= start_indices  # skip the start itself
+        start_rows = order[group_starts[groups] + start_indices]
+        goal_rows = order[group_starts[groups] + goal_indices]
+
+    starts = free_positions[start_rows].tolist()
+    goals = free_positions[goal_rows].tolist()
+    return {i: {"start": tuple(start), "goal": tuple(goal)} for i, (start, goal) in enumerate(zip(starts, goals))}
 
 def create_map(seed, map_config):
     random_generator = random.Random(seed)
@@ -50,16 +58,19 @@ def create_map(seed, map_config):
 
     return map
 
-def create_positions(map, spawns_per_map):
-    free_positions = map.get_free_positions()
-    max_possible_pairs = len(free_positions) * (len(free_positions) - 1)  # n * (n-1) since order matters
-    spawns_per_map = min(spawns_per_map, max_possible_pairs)
+def create_positions(map, spawns_per_map, free_positions=None, seed=None, same_component=False):
+    if free_positions is None:
+        free_positions = map.get_free_positions()
 
-    if spawns_per_map < spawns_per_map:
-        print(
-            f"Warning: Reduced spawns_per_map from {spawns_per_map} to {spawns_per_map} to respect map size constraints")
+    components = None
+    if same_component:
+        components = map.component_labels[free_positions[:, 0] + 1, free_positions[:, 1] + 1]
+    start_goal_pairs = find_start_and_goal_positions(spawns_per_map, free_positions, np.random.default_rng(seed),
+                                                     components)
+    if len(start_goal_pairs) < spawns_per_map:
+        print(f"Warning: Reduced spawns_per_map from {spawns_per_map} to {len(start_goal_pairs)} "
+              f"to respect map size constraints")
 
-    start_goal_pairs = find_start_and_goal_positions(spawns_per_map, free_positions)
     return start_goal_pairs
 
 def _get_generation_agent(agent_type, positions, seed, agent_traces):
@@ -68,63 +79,111 @@ def _get_generation_agent(agent_type, positions, seed, agent_traces):
     return factory.create(agent_type, **params)
 
 
-def _create_generate_tasks(seed, agent_traces):
+def _create_generate_descriptors():
     maps_to_test = config.CONFIG["maps_to_test"]
     spawns_per_map = config.CONFIG["spawns_per_map"]
     agent_types = config.CONFIG["agent_types"]
 
-    tasks = []
+    descriptors = []
     for map_index in range(maps_to_test):
         print(f"processing map index: {map_index}")
-        map_seed = seed + map_index
-        current_map = create_map(map_seed, config.CONFIG["map"])
-        start_goal_pairs = create_positions(current_map, spawns_per_map)
-        for key, position_pairs in tqdm(start_goal_pairs.items()):
+        map_seed = config.CONFIG["seed"] + map_index
+        _, start_goal_pairs = get_map_and_positions(map_seed)
+        for key in start_goal_pairs:
             for agent_type in agent_types:
-                agent = _get_generation_agent(agent_type, position_pairs, seed, agent_traces)
+                descriptors.append(TaskDescriptor(seed=map_seed, map_index=map_index, position_index=key,
+                                                  agent_type=agent_type))
 
-                task = TaskSpec(seed=map_seed, position_index=key, map_index=map_index, game_map=current_map,
-                                agent=agent)
-                tasks.append(task)
+    return descriptors
 
-    return tasks
-
-def _create_replay_tasks(seed):
+def _create_replay_descriptors():
     replay_folder = config.CONFIG["replay_folder"]
 
-    agent_file = os.path.join(replay_folder, "agent_output.json")
-    with open(agent_file, "r") as f:
-        agent_data = orjson.loads(f.read())
-
-    map_file = os.path.join(replay_folder, "map_output.json")
-    with open(map_file, "r") as f:
-        map_data = orjson.loads(f.read())
-
-    tasks = []
-    for agent_trace in tqdm(agent_data):
-        map_index = agent_trace["map_index"]
-        map_seed = map_data[str(map_index)]["seed"]
-        spawn_index = agent_trace["spawn_index"]
+    # grids are rebuilt from the seed, no need to keep them around
+    map_configs = {map_index: {k: v for k, v in map_trace.items() if k not in ("grid", "erosion")}
+                   for map_index, map_trace in iter_map_traces(replay_folder, decode_arrays=False)}
 
-        current_map = create_map(map_seed, map_data[str(map_index)])
+    descriptors = []
+    for agent_trace in iter_agent_traces(replay_folder):
+        map_config = map_configs[int(agent_trace["map_index"])]
+        descriptors.append(TaskDescriptor(seed=map_config["seed"], map_index=agent_trace["map_index"],
+                                          position_index=agent_trace["spawn_index"], agent_type="replay",
+                                          map_config=map_config, trace=agent_trace))
 
-        agent = partial(ReplayAgent, trace=agent_trace)
-        task = TaskSpec(seed=map_seed, position_index=spawn_index, map_index=map_index, game_map=current_map,
-                        agent=agent)
-        tasks.append(task)
+    return descriptors
 
-    return tasks
-
-def create_tasks(agent_traces):
-    if config.CONFIG["seed"] is not None:
-        seed = config.CONFIG["seed"]
-    else:
-        seed = random.randint(0, 99999)
+def create_task_descriptors():
+    if config.CONFIG["seed"] is None:
+        config.CONFIG["seed"] = random.randint(0, 99999)
 
     runtime_type = config.CONFIG["runtime_type"]
     if runtime_type == "Generate":
-        tasks = _create_generate_tasks(seed, agent_traces)
+        descriptors = _create_generate_descriptors()
     elif runtime_type == "Replay":
-        tasks = _create_replay_tasks(seed)
+        descriptors = _create_replay_descriptors()
+
+    return descriptors
+
+# maps are rebuilt from their seed, this keeps the last few around (descriptors are grouped by map) and, when a
+# cache folder is configured, shares them between runs and worker processes. A map takes three entries: the map,
+# its free positions and its start/goal pairs.
+_map_cache = MapCache(max_entries=24)
+
+def _get_cache_key_config(map_config):
+    # replayed map configs come from traces, where the seed is stored next to the map parameters
+    return {k: v for k, v in map_config.items() if k != "seed"}
+
+def get_map(map_seed, map_config=None):
+    map_config = config.CONFIG["map"] if map_config is None else map_config
+    key = MapCache.make_key("map", map_seed, _get_cache_key_config(map_config))
+    return _map_cache.get(key, partial(create_map, map_seed, map_config), config.CONFIG.get("cache_folder"))
+
+def get_map_and_positions(map_seed, map_config=None, spawns_per_map=None):
+    """Return the map of a seed and its start/goal pairs, from the cache when possible."""
+    map_config = config.CONFIG["map"] if map_config is None else map_config
+    spawns_per_map = config.CONFIG["spawns_per_map"] if spawns_per_map is None else spawns_per_map
+    same_component = config.CONFIG.get("spawn_same_component", True)
+    cache_folder = config.CONFIG.get("cache_folder")
+    key_config = _get_cache_key_config(map_config)
+
+    current_map = get_map(map_seed, map_config)
+    free_positions = _map_cache.get(MapCache.make_key("free_positions", map_seed, key_config),
+                                    current_map.get_free_positions, cache_folder)
+
+    start_goal_pairs = _map_cache.get(
+        MapCache.make_key("spawns", map_seed, key_config, spawns_per_map, same_component),
+        partial(create_positions, current_map, spawns_per_map, free_positions, map_seed, same_component),
+        cache_folder)
+    return current_map, start_goal_pairs
+
+# config entries that change the outcome of a task, output settings and the size of the sweep do not
+TASK_CONFIG_KEYS = ("seed", "runtime_type", "replay_folder", "spawns_per_map", "spawn_same_component",
+                    "agent_export_fields", "map", "game")
+
+def compute_config_hash():
+    task_config = {key: config.CONFIG.get(key) for key in TASK_CONFIG_KEYS}
+    return hashlib.sha1(orjson.dumps(task_config, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+
+def get_task_key(descriptor, config_hash):
+    """Key of a task, stored in its agent trace to resume a run: (map seed, spawn index, agent type, config hash)."""
+    agent_type = descriptor.agent_type
+    if descriptor.trace is not None:
+        # every trace is replayed by the replay agent, the agent that recorded it tells them apart
+        agent_type = f"{agent_type}:{descriptor.trace.get('agent_type')}"
+    return descriptor.seed, descriptor.position_index, agent_type, config_hash
+
+def build_task(descriptor, agent_traces=None):
+    if descriptor.trace is not None:
+        current_map = get_map(descriptor.seed, descriptor.map_config)
+        agent = partial(ReplayAgent, trace=descriptor.trace)
+    else:
+        current_map, start_goal_pairs = get_map_and_positions(descriptor.seed, descriptor.map_config)
+        position_pairs = start_goal_pairs[descriptor.position_index]
+        agent = _get_generation_agent(descriptor.agent_type, position_pairs, config.CONFIG["seed"], agent_traces)
 
-    return tasks
\ No newline at end of file
+    return TaskSpec(seed=descriptor.seed, position_index=descriptor.position_index, map_index=descriptor.map_index,
+                    game_map=current_map, agent=agent)
+
+def create_tasks(agent_traces):
+    descriptors = create_task_descriptors()
+    return [build_task(descriptor, agent_traces) for descriptor in tqdm(descriptors)]
@@ -0,0 +1,328 @@
+import gzip
+import math
+import os
+import time
+import zlib
+from typing import NamedTuple
+
+import numpy as np
+import orjson
+
+AGENT_TRACE_FILE = "agent_output.jsonl"
+MAP_TRACE_FILE = "map_output.jsonl"
+LEGACY_AGENT_TRACE_FILE = "agent_output.json"
+LEGACY_MAP_TRACE_FILE = "map_output.json"
+
+# binary traces keep these fields in raw array files next to the JSON lines, which only hold a reference to them
+GRID_STORE = "grids"
+PATH_STORE = "paths"
+GRID_FIELDS = ("grid", "erosion")
+PATH_FIELDS = ("agent_visited", "agent_explored")
+
+_DUMP_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+_ARRAY_ALIGNMENT = 8
+
+
+class PackedGrid(NamedTuple):
+    """A grid stored with one bit per cell, bits is memory-mapped when read from a binary trace."""
+    bits: np.ndarray
+    shape: tuple
+    dtype: str
+
+    def unpack(self):
+        return np.unpackbits(self.bits, count=math.prod(self.shape)).reshape(self.shape).astype(self.dtype)
+
+
+def pack_grid(grid):
+    """Pack a grid, nested lists or array, into a PackedGrid. Every non zero cell becomes a set bit."""
+    grid = np.asarray(grid)
+    return PackedGrid(np.packbits(grid != 0), grid.shape, str(grid.dtype))
+
+
+def _store_path(folder, store):
+    return os.path.join(folder, store + ".bin")
+
+
+def _trace_path(folder, file_name, compression):
+    return os.path.join(folder, file_name + (".gz" if compression == "gzip" else ""))
+
+
+def _find_trace_file(folder, file_name):
+    """Return (path, compression) of an existing trace file, plain or compressed, or (None, None)."""
+    for compression in (None, "gzip"):
+        path = _trace_path(folder, file_name, compression)
+        if os.path.exists(path):
+            return path, compression
+    return None, None
+
+
+def _read_lines(path, compression):
+    """
+    Yield every complete line of a trace file. A crash can leave a partial line or a truncated gzip member at the
+    end of the file, that tail is silently dropped.
+    """
+    opener = gzip.open if compression == "gzip" else open
+    with opener(path, "rb") as f:
+        try:
+            for line in f:
+                if line.endswith(b"\n"):
+                    yield line
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            return
+
+
+class _ArrayStore:
+    """
+    Append-only file of raw arrays. Arrays are aligned on 8 bytes and referenced by their byte offset, so the file
+    can be memory-mapped and sliced without parsing anything.
+    """
+
+    def __init__(self, folder, store):
+        self.store = store
+        self._file = open(_store_path(folder, store), "ab")
+
+    def append(self, array, encoding, shape, dtype):
+        offset = self._file.seek(0, os.SEEK_END)
+        padding = -offset % _ARRAY_ALIGNMENT
+        self._file.write(b"\0" * padding)
+        self._file.write(np.ascontiguousarray(array).tobytes())
+        self._file.flush()
+        return {"store": self.store, "offset": offset + padding, "encoding": encoding, "shape": list(shape),
+                "dtype": dtype}
+
+    def append_grid(self, grid):
+        packed = pack_grid(grid)
+        return self.append(packed.bits, "packbits", packed.shape, packed.dtype)
+
+    def append_path(self, path):
+        path = np.asarray(path, dtype=np.int32).reshape(-1, 2)
+        return self.append(path, "raw", path.shape, "int32")
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _ArrayReader:
+    """Resolve the array references of binary traces against memory-mapped store files."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._stores = {}
+
+    def _get_store(self, store):
+        if store not in self._stores:
+            path = _store_path(self.folder, store)
+            # np.memmap refuses empty files, a store with nothing referenced yet can be one
+            self._stores[store] = (np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path)
+                                   else np.empty(0, dtype=np.uint8))
+        return self._stores[store]
+
+    def decode(self, ref, packed=False):
+        data = self._get_store(ref["store"])
+        offset, shape = ref["offset"], tuple(ref["shape"])
+
+        if ref["encoding"] == "packbits":
+            bits = data[offset:offset + (math.prod(shape) + 7) // 8]
+            grid = PackedGrid(bits, shape, ref["dtype"])
+            return grid if packed else grid.unpack()
+
+        dtype = np.dtype(ref["dtype"])
+        return data[offset:offset + math.prod(shape) * dtype.itemsize].view(dtype).reshape(shape)
+
+    def decode_trace(self, trace, fields, packed=False):
+        for field in fields:
+            if isinstance(trace.get(field), dict):
+                trace[field] = self.decode(trace[field], packed)
+        return trace
+
+
+class TraceWriter:
+    """
+    Append-only sink for experiment traces. Every finished task adds one JSON line to agent_output.jsonl and every
+    map is written once to map_output.jsonl, so a crash only loses what was not flushed yet.
+
+    With trace_format "binary" the grids are bit-packed into grids.bin and the paths go to paths.bin as int32 (N, 2)
+    arrays, the JSON lines only keep a reference to them. Those files are never compressed so they can be
+    memory-mapped by the readers.
+
+    Tasks written with a task key keep it in their agent line. The keys found in agent_output.jsonl when the writer
+    opens a folder are in completed_tasks, so a resumed run can skip them, and a task is done exactly when its trace
+    is on disk.
+
+    Files are flushed after every line and fsynced every fsync_interval seconds. Opening a folder that already holds
+    traces appends to them, after dropping a partially written tail.
+    """
+
+    def __init__(self, output_dir, compression=None, trace_format="json", fsync_interval=5.0):
+        if compression not in (None, "none", "gzip"):
+            raise ValueError(f"Unknown trace compression '{compression}'")
+        if trace_format not in ("json", "binary"):
+            raise ValueError(f"Unknown trace format '{trace_format}'")
+
+        self.output_dir = output_dir
+        self.compression = None if compression == "none" else compression
+        self.trace_format = trace_format
+        self.fsync_interval = fsync_interval
+        self._last_fsync = time.monotonic()
+
+        os.makedirs(output_dir, exist_ok=True)
+        self._repair(AGENT_TRACE_FILE, self.compression)
+        self._repair(MAP_TRACE_FILE, self.compression)
+        self.written_maps = set()
+        if _find_trace_file(output_dir, MAP_TRACE_FILE)[0] is not None:
+            self.written_maps = {map_index for map_index, _ in iter_map_traces(output_dir, decode_arrays=False)}
+
+        self.completed_tasks = set()
+        if _find_trace_file(output_dir, AGENT_TRACE_FILE)[0] is not None:
+            self.completed_tasks = set(iter_completed_tasks(output_dir))
+
+        self._agent_file = self._open(AGENT_TRACE_FILE)
+        self._map_file = self._open(MAP_TRACE_FILE)
+        self._stores = []
+        if trace_format == "binary":
+            self._grid_store = _ArrayStore(output_dir, GRID_STORE)
+            self._path_store = _ArrayStore(output_dir, PATH_STORE)
+            self._stores = [self._grid_store, self._path_store]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _repair(self, file_name, expected_compression):
+        """Drop a partially written tail left by a crash so new lines can be appended after the last complete one."""
+        path, compression = _find_trace_file(self.output_dir, file_name)
+        if path is None:
+            return
+        if compression != expected_compression:
+            raise ValueError(f"{path} exists with a different compression than requested")
+
+        if compression is None:
+            valid_size = sum(len(line) for line in _read_lines(path, compression))
+            if valid_size != os.path.getsize(path):
+                with open(path, "r+b") as f:
+                    f.truncate(valid_size)
+            return
+
+        try:
+            with gzip.open(path, "rb") as f:
+                last_chunk = b""
+                while chunk := f.read(1 << 20):
+                    last_chunk = chunk
+            if not last_chunk or last_chunk.endswith(b"\n"):
+                return
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            pass
+
+        repaired_path = path + ".repair"
+        with gzip.open(repaired_path, "wb") as f:
+            f.writelines(_read_lines(path, compression))
+        os.replace(repaired_path, path)
+
+    def _open(self, file_name):
+        path = _trace_path(self.output_dir, file_name, self.compression)
+        if self.compression == "gzip":
+            return gzip.open(path, "ab")
+        return open(path, "ab")
+
+    def _write_line(self, f, trace):
+        f.write(orjson.dumps(trace, option=_DUMP_OPTIONS) + b"\n")
+        f.flush()  # gzip files do a zlib sync flush, so everything written so far can be decompressed
+
+        if time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self.sync()
+
+    def write_agent_trace(self, agent_trace, task_key=None):
+        """Write an agent trace. A task key is stored in the trace line itself, see get_task_key."""
+        if task_key is not None:
+            agent_trace = {**agent_trace, "task_key": list(task_key)}
+        if self.trace_format == "binary":
+            agent_trace = {k: self._path_store.append_path(v) if k in PATH_FIELDS else v
+                           for k, v in agent_trace.items()}
+        self._write_line(self._agent_file, agent_trace)
+
+        if task_key is not None:
+            self.completed_tasks.add(tuple(task_key))
+
+    def write_map_trace(self, map_index, map_trace):
+        """Write the map trace unless this map was already written. Returns True if it was written."""
+        if map_index in self.written_maps:
+            return False
+
+        if self.trace_format == "binary":
+            map_trace = {k: self._grid_store.append_grid(v) if k in GRID_FIELDS else v for k, v in map_trace.items()}
+        self._write_line(self._map_file, {"map_index": map_index, **map_trace})
+        self.written_maps.add(map_index)
+        return True
+
+    def sync(self):
+        # arrays first, a line on disk must never reference bytes that are not
+        for store in self._stores:
+            store.flush()
+            os.fsync(store.fileno())
+        for f in (self._agent_file, self._map_file):
+            raw = f.fileobj if self.compression == "gzip" else f
+            raw.flush()
+            os.fsync(raw.fileno())
+        self._last_fsync = time.monotonic()
+
+    def close(self):
+        if self._agent_file.closed:
+            return
+        self.sync()
+        self._agent_file.close()
+        self._map_file.close()
+        for store in self._stores:
+            store.close()
+
+
+def iter_agent_traces(folder, decode_arrays=True):
+    """
+    Lazily yield the agent traces of an experiment folder, streamed or legacy json.
+    Paths of binary traces are int32 (N, 2) arrays memory-mapped from paths.bin, or the raw references when
+    decode_arrays is False.
+    """
+    path, compression = _find_trace_file(folder, AGENT_TRACE_FILE)
+    if path is not None:
+        reader = _ArrayReader(folder)
+        for line in _read_lines(path, compression):
+            trace = orjson.loads(line)
+            yield reader.decode_trace(trace, PATH_FIELDS) if decode_arrays else trace
+        return
+
+    with open(os.path.join(folder, LEGACY_AGENT_TRACE_FILE), "rb") as f:
+        yield from orjson.loads(f.read())
+
+
+def iter_map_traces(folder, decode_arrays=True, packed=False):
+    """
+    Lazily yield (map_index, map_trace) of an experiment folder, streamed or legacy json.
+    Grids of binary traces are unpacked to arrays, or left as memory-mapped PackedGrid when packed is True.
+    """
+    path, compression = _find_trace_file(folder, MAP_TRACE_FILE)
+    if path is not None:
+        reader = _ArrayReader(folder)
+        for line in _read_lines(path, compression):
+            trace = orjson.loads(line)
+            if decode_arrays:
+                reader.decode_trace(trace, GRID_FIELDS, packed)
+            yield int(trace.pop("map_index")), trace
+        return
+
+    with open(os.path.join(folder, LEGACY_MAP_TRACE_FILE), "rb") as f:
+        for map_index, trace in orjson.loads(f.read()).items():
+            yield int(map_index), trace
+
+
+def iter_completed_tasks(folder):
+    """Lazily yield the (map_seed, spawn_index, agent_type, config_hash) keys of the tasks traced in a folder."""
+    for trace in iter_agent_traces(folder, decode_arrays=False):
+        if "task_key" in trace:
+            yield tuple(trace["task_key"])
@@ -1,7 +1,7 @@
 import argparse
 
 from config import load_config
-from game_logic.game_loop import interactive_main_loop
+from game_logic.interactive_loop import interactive_main_loop
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import argparse
+import os
 
 from config import load_config
 from game_logic.game_loop import run_experiments_parallel
@@ -6,11 +7,24 @@ from game_logic.game_loop import run_experiments_parallel
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run experiments in headless mode without GUI.")
-    parser.add_argument("--config", type=str, default="configs/simple_generate_config.yaml", help="YAML config path")
+    parser.add_argument("--config", type=str, default=None,
+                        help="YAML config path, configs/simple_generate_config.yaml or the config of --resume")
     parser.add_argument("--schema", type=str, default="configs/schemas/project_schema.yaml", help="YAML schema path")
     parser.add_argument("--workers", type=int, default=8, help="Number of parallel workers")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Number of tasks sent to a worker at once")
+    parser.add_argument("--realtime", action="store_true", help="Throttle tasks to the configured fps instead of using the simulated clock")
+    parser.add_argument("--resume", type=str, default=None,
+                        help="Output folder of an interrupted run, only its missing tasks are run and appended")
+    parser.add_argument("--batch", action="store_true",
+                        help="Plan the tasks of static maps in one batch per map and agent instead of stepping them")
 
     args = parser.parse_args()
-    project_config = load_config(args.config, args.schema)
+    config_path = args.config
+    if config_path is None:
+        # a resumed run reuses the exported config, it holds the seed that was drawn if none was set
+        config_path = (os.path.join(args.resume, "used_config.yaml") if args.resume is not None
+                       else "configs/simple_generate_config.yaml")
+    project_config = load_config(config_path, args.schema)
 
-    run_experiments_parallel(project_config, max_workers=args.workers)
+    run_experiments_parallel(project_config, max_workers=args.workers, simulated_clock=not args.realtime,
+                             chunk_size=args.chunk_size, resume_dir=args.resume, batch_static=args.batch)
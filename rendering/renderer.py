@@ -0,0 +1,41 @@
+import pygame
+
+EXPLORED_COLOR = (173, 216, 230)  # light blue
+VISITED_COLOR = (144, 238, 144)  # light green
+
+
+def _cell_rect(position, cell_size):
+    x, y = position
+    return pygame.Rect(x * cell_size, y * cell_size, cell_size, cell_size)
+
+
+def draw_agent(surface, agent, cell_size):
+    """Visualize explored and visited positions."""
+    for position in agent.explored:
+        pygame.draw.rect(surface, EXPLORED_COLOR, _cell_rect(position, cell_size))
+
+    for position in agent.visited:
+        pygame.draw.rect(surface, VISITED_COLOR, _cell_rect(position, cell_size))
+
+
+def draw_map(surface, game_map, cell_size):
+    for y in range(game_map.height):
+        for x in range(game_map.width):
+            if game_map.grid[y, x] == 1:
+                pygame.draw.rect(surface, game_map.color_obstacle, _cell_rect((x, y), cell_size))
+            elif game_map.erosion[y, x]:
+                pygame.draw.rect(surface, game_map.color_erosion, _cell_rect((x, y), cell_size))
+
+    for x in range(game_map.width):
+        pygame.draw.line(surface, game_map.color_grid_line, (x * cell_size, 0), (x * cell_size, game_map.height * cell_size))
+    for y in range(game_map.height):
+        pygame.draw.line(surface, game_map.color_grid_line, (0, y * cell_size), (game_map.width * cell_size, y * cell_size))
+
+
+def draw_game(surface, game):
+    draw_agent(surface, game.agent, game.cell_size)
+    draw_map(surface, game.gameplay_map, game.cell_size)
+
+    pygame.draw.rect(surface, game.color_goal, _cell_rect(game.agent.goal, game.cell_size))
+    pygame.draw.rect(surface, game.color_agent, _cell_rect(game.agent.position, game.cell_size))
+    pygame.draw.rect(surface, game.color_start, _cell_rect(game.agent.start, game.cell_size))